@@ -0,0 +1,84 @@
+import hashlib
+import os
+import threading
+
+import click
+from flasgger import Swagger
+from flask import current_app, request
+
+
+class CachedSwagger(Swagger):
+    """
+    Swagger that builds each API spec once and serves the serialized JSON.
+
+    flasgger parses the YAML docstrings of every route into a spec dict
+    and jsonifies that dict again on every request to /apispec_1.json. In
+    debug mode it even rebuilds the dict each time. Here the first request
+    builds and serializes the spec. Later requests get the same bytes with
+    an ETag, and a 304 if the client already has them. The parsed dict is
+    dropped once serialized.
+
+    To skip the docstring parsing in deployed workers entirely, build the
+    specs ahead of time with `flask --app app apispec DIRECTORY`. Then
+    point the 'compiled_specs' Swagger config at that directory.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._spec_cache = {}  # spec endpoint -> (body, etag)
+        self._spec_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app, decorators=None):
+        super().init_app(app, decorators)
+
+        @app.cli.command('apispec')
+        @click.argument('directory')
+        def build_apispecs(directory):
+            """Write every API spec as <endpoint>.json into DIRECTORY."""
+            os.makedirs(directory, exist_ok=True)
+            for spec in self.config['specs']:
+                path = os.path.join(directory, f"{spec['endpoint']}.json")
+                with open(path, 'wb') as f:
+                    f.write(self.compiled_spec(spec['endpoint'])[0])
+                click.echo(path)
+
+    def register_views(self, app):
+        super().register_views(app)
+        blueprint = self.config.get('endpoint', 'flasgger')
+        for spec in self.config['specs']:
+            view = self._spec_view(spec['endpoint'])
+            for decorator in self.decorators or ():
+                view = decorator(view)
+            app.view_functions[f"{blueprint}.{spec['endpoint']}"] = view
+
+    def _spec_view(self, endpoint):
+        def view():
+            body, etag = self.compiled_spec(endpoint)
+            response = current_app.response_class(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+
+        view.__name__ = endpoint
+        return view
+
+    def compiled_spec(self, endpoint):
+        """Return (JSON body, ETag) for a spec, building it on first use."""
+        cached = self._spec_cache.get(endpoint)
+        if cached is None:
+            with self._spec_lock:
+                cached = self._spec_cache.get(endpoint)
+                if cached is None:
+                    body = self._load_compiled(endpoint)
+                    if body is None:
+                        body = current_app.json.dumps(self.get_apispecs(endpoint)).encode()
+                        self.apispecs.pop(endpoint, None)
+                    cached = self._spec_cache[endpoint] = (body, hashlib.blake2b(body, digest_size=16).hexdigest())
+        return cached
+
+    def _load_compiled(self, endpoint):
+        directory = self.config.get('compiled_specs')
+        if not directory:
+            return None
+        with open(os.path.join(directory, f"{endpoint}.json"), 'rb') as f:
+            return f.read()
@@ -1,20 +1,59 @@
-from flask import Flask
+import json
+import logging
+import os
+import random
+import time
+import click
+from flask import Flask, g, request
+from werkzeug.middleware.proxy_fix import ProxyFix
 from routes import routes_blueprint
-from database import init_db
+from database import check_schema, migrate
 from flask_jwt_extended import JWTManager
-from flasgger import Swagger
+from apidocs import CachedSwagger
 from datetime import timedelta
 from flask_cors import CORS
+from json_provider import FastJSONProvider
+from timing import RequestTimings, current_timings
 
 app = Flask(__name__)
+
+# Behind a reverse proxy, request.remote_addr is the proxy's address, and the per-IP login
+# limit would then put every client in one bucket. Set TRUSTED_PROXIES to the number of proxies
+# in front of the app to take the client address from X-Forwarded-For instead. Leave it at 0
+# when clients reach the app directly, or they could forge the header to dodge the limit.
+trusted_proxies = int(os.environ.get('TRUSTED_PROXIES', '0'))
+if trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 app.config['JWT_SECRET_KEY'] = 'super_secret_key'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
 
+# Production workers can set API_DOCS_UI=0 to serve only the JSON spec, without the /apidocs/ UI,
+# and API_SPEC_DIR to serve specs prebuilt with `flask --app app apispec DIR` instead of parsing docstrings
+app.config['SWAGGER'] = {
+    'swagger_ui': os.environ.get('API_DOCS_UI', '1') != '0',
+    'compiled_specs': os.environ.get('API_SPEC_DIR'),
+}
+
+# Fraction of requests that get a Server-Timing header and a timing log line;
+# the rest skip the instrumentation entirely
+app.config['REQUEST_TIMING_SAMPLE_RATE'] = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', '0.01'))
+
+# The timing lines get a logger of their own: app.logger only passes INFO through in debug mode.
+# They go to stderr as bare JSON, at INFO unless REQUEST_TIMING_LOG_LEVEL says otherwise.
+timing_logger = logging.getLogger('banking_api.request_timing')
+timing_logger.setLevel(os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'INFO').upper())
+timing_logger.propagate = False
+if not timing_logger.handlers:
+    timing_handler = logging.StreamHandler()
+    timing_handler.setFormatter(logging.Formatter('%(message)s'))
+    timing_logger.addHandler(timing_handler)
+
 jwt = JWTManager(app)
 
-Swagger(app, template={
+CachedSwagger(app, template={
     "swagger": "2.0",
     "info": {
         "title": "Banking API",
@@ -35,11 +74,55 @@ Swagger(app, template={
     "security": [{"BearerAuth": []}],
 })
 
-# Initialize the database
-init_db()
+# Workers only verify the schema version; creating and altering tables is left to
+# `flask --app app migrate`. Other CLI commands (migrate itself, apispec) skip the check.
+cli = click.get_current_context(silent=True)
+if cli is None or cli.info_name == 'run':
+    check_schema()
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Bring the database schema up to date."""
+    applied = migrate()
+    for version, description in applied:
+        click.echo(f"Applied migration {version}: {description}")
+    if not applied:
+        click.echo("Database schema is up to date")
 
 # Register blueprints
 app.register_blueprint(routes_blueprint)
 
+@app.before_request
+def start_request_timing():
+    if random.random() < app.config['REQUEST_TIMING_SAMPLE_RATE']:
+        g.request_timings = RequestTimings()
+        current_timings.set(g.request_timings)
+
+@app.after_request
+def report_request_timing(response):
+    timings = g.pop('request_timings', None)
+    if timings is None:
+        return response
+    total = time.perf_counter() - timings.started
+    # Streamed bodies are still to be produced, so their time isn't included
+    response.headers['Server-Timing'] = timings.server_timing(total)
+    timing_logger.info(json.dumps({
+        'event': 'request_timing',
+        'method': request.method,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 3),
+        'db_ms': round(timings.db * 1000, 3),
+        'queries': timings.queries,
+        'rows': timings.rows,
+        'pool_ms': round(timings.pool * 1000, 3),
+        'serialize_ms': round(timings.serialize * 1000, 3),
+    }))
+    return response
+
+@app.teardown_request
+def stop_request_timing(exc):
+    current_timings.set(None)
+
 if __name__ == '__main__':
     app.run(debug=True)
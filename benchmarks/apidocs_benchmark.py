@@ -0,0 +1,124 @@
+"""
+Startup time, memory and /apispec_1.json latency of the API docs setup.
+
+Each configuration is measured in fresh interpreter processes importing
+app.py (with check_schema stubbed out, so no database is needed):
+
+  flasgger  - plain flasgger.Swagger, as app.py was wired before
+  cached    - CachedSwagger, spec built on first request and kept as JSON
+  noui      - CachedSwagger with API_DOCS_UI=0
+  prebuilt  - CachedSwagger serving specs built by `flask apispec`
+              (API_SPEC_DIR), with API_DOCS_UI=0
+
+--debug measures with app.debug on, where flasgger rebuilds the spec from
+the docstrings on every request.
+
+    python -m benchmarks.apidocs_benchmark --runs 5 --requests 50
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ('flasgger', 'cached', 'noui', 'prebuilt')
+
+
+def load_app(mode):
+    import apidocs
+    import database
+
+    database.check_schema = lambda: None
+    if mode == 'flasgger':
+        from flasgger import Swagger
+        apidocs.CachedSwagger = Swagger
+    import app
+    return app.app
+
+
+def build_specs(directory):
+    result = load_app('cached').test_cli_runner().invoke(args=['apispec', directory])
+    assert result.exit_code == 0, result.output
+
+
+def child(mode, requests, debug):
+    started = time.perf_counter()
+    app = load_app(mode)
+    startup = time.perf_counter() - started
+    rss_startup = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    app.debug = debug
+    client = app.test_client()
+    started = time.perf_counter()
+    first = client.get('/apispec_1.json')
+    first_request = time.perf_counter() - started
+    assert first.status_code == 200, first.status_code
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get('/apispec_1.json')
+        timings.append(time.perf_counter() - started)
+
+    print(json.dumps({
+        'startup': startup,
+        'first_request': first_request,
+        'request': statistics.median(timings),
+        'rss_startup': rss_startup,
+        'rss_peak': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'bytes': len(first.get_data()),
+    }))
+
+
+def run_child(args, env):
+    return subprocess.run(
+        [sys.executable, '-m', 'benchmarks.apidocs_benchmark', *args],
+        env=dict(os.environ, **env), check=True, capture_output=True, text=True,
+    ).stdout
+
+
+def measure(mode, requests, debug, spec_dir):
+    env = {'API_DOCS_UI': '0' if mode in ('noui', 'prebuilt') else '1'}
+    if mode == 'prebuilt':
+        env['API_SPEC_DIR'] = spec_dir
+    args = ['--child', mode, '--requests', str(requests)] + (['--debug'] if debug else [])
+    output = run_child(args, env)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per configuration')
+    parser.add_argument('--requests', type=int, default=50, help='spec requests after the first, per process')
+    parser.add_argument('--debug', action='store_true', help='run the app in debug mode')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--build', metavar='DIRECTORY', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.requests, args.debug)
+        return
+    if args.build:
+        build_specs(args.build)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='apispec-') as spec_dir:
+        run_child(['--build', spec_dir], {})
+
+        print(f"medians of {args.runs} processes{', debug mode' if args.debug else ''}; RSS is peak resident size in MB")
+        print(f"  {'mode':>12} {'startup ms':>11} {'first spec ms':>14} {'spec ms':>8} {'RSS start':>10} {'RSS peak':>9}")
+        for mode in MODES:
+            runs = [measure(mode, args.requests, args.debug, spec_dir) for _ in range(args.runs)]
+
+            def median(key):
+                return statistics.median(run[key] for run in runs)
+
+            print(f"  {mode:>12} {median('startup') * 1000:11.1f} {median('first_request') * 1000:14.1f} "
+                  f"{median('request') * 1000:8.2f} {median('rss_startup') / 1024:10.1f} {median('rss_peak') / 1024:9.1f}")
+
+if __name__ == '__main__':
+    main()
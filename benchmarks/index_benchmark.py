@@ -0,0 +1,119 @@
+"""
+Query plan and latency of the hot lookups with and without the secondary
+indexes declared in database.INDEXES.
+
+Runs against the database in DB_CONFIG (MySQL 8.0+, which can toggle index
+visibility without dropping anything). Load realistic data first, then:
+
+    python -m benchmarks.index_benchmark --runs 200
+"""
+import argparse
+import statistics
+import time
+
+from database import INDEXES, get_db_connection
+
+
+def sample_params(cursor):
+    cursor.execute("SELECT from_account_id FROM transaction ORDER BY transaction_timestamp DESC LIMIT 1")
+    row = cursor.fetchone()
+    account_id = row['from_account_id'] if row else ''
+    cursor.execute("SELECT loan_id FROM loan_payment LIMIT 1")
+    row = cursor.fetchone()
+    loan_id = row['loan_id'] if row else ''
+    return account_id, loan_id
+
+
+def cases(account_id, loan_id):
+    return [
+        (
+            'account history (OR)',
+            ['idx_transaction_from_account', 'idx_transaction_to_account'],
+            "SELECT * FROM transaction WHERE from_account_id = %s OR to_account_id = %s",
+            (account_id, account_id),
+        ),
+        (
+            'account outgoing, newest first',
+            ['idx_transaction_from_account'],
+            "SELECT * FROM transaction WHERE from_account_id = %s ORDER BY transaction_timestamp DESC LIMIT 100",
+            (account_id,),
+        ),
+        (
+            'account incoming, newest first',
+            ['idx_transaction_to_account'],
+            "SELECT * FROM transaction WHERE to_account_id = %s ORDER BY transaction_timestamp DESC LIMIT 100",
+            (account_id,),
+        ),
+        (
+            'transactions page',
+            ['idx_transaction_timestamp'],
+            "SELECT * FROM transaction ORDER BY transaction_timestamp DESC, transaction_id DESC LIMIT 101",
+            (),
+        ),
+        (
+            'loan payments by loan',
+            ['idx_loan_payment_loan'],
+            "SELECT * FROM loan_payment WHERE loan_id = %s ORDER BY payment_date",
+            (loan_id,),
+        ),
+        (
+            'resolved tickets per employee',
+            ['idx_customer_support_status'],
+            "SELECT employee_id, COUNT(*) AS resolved_tickets FROM customer_support "
+            "WHERE status = 'RESOLVED' GROUP BY employee_id",
+            (),
+        ),
+    ]
+
+
+def set_visibility(cursor, index_names, visible):
+    tables = {name: table for table, name, _ in INDEXES}
+    for name in index_names:
+        state = 'VISIBLE' if visible else 'INVISIBLE'
+        cursor.execute(f"ALTER TABLE `{tables[name]}` ALTER INDEX {name} {state}")
+
+
+def measure(cursor, query, params, runs):
+    cursor.execute(f"EXPLAIN {query}", params)
+    plan = [(row['table'], row['type'], row['key'], row['rows'], row['Extra']) for row in cursor.fetchall()]
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return plan, statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=100, help='executions per query and index state')
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        account_id, loan_id = sample_params(cursor)
+        for label, index_names, query, params in cases(account_id, loan_id):
+            print(f"== {label}")
+            results = {}
+            for visible in (False, True):
+                set_visibility(cursor, index_names, visible)
+                results[visible] = measure(cursor, query, params, args.runs)
+            for visible, (plan, p50, p95) in results.items():
+                state = 'with indexes   ' if visible else 'without indexes'
+                print(f"  {state}  p50 {p50 * 1000:8.3f} ms  p95 {p95 * 1000:8.3f} ms")
+                for table, access, key, rows, extra in plan:
+                    print(f"      {table}: type={access} key={key} rows={rows} {extra or ''}")
+            speedup = results[False][1] / results[True][1] if results[True][1] else float('inf')
+            print(f"  p50 speedup x{speedup:.1f}")
+    finally:
+        # Never leave an index invisible behind
+        set_visibility(cursor, [name for _, name, _ in INDEXES], True)
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+JSON response encoding time for large result sets, per JSON provider.
+
+Builds --rows synthetic rows shaped like DictCursor results from the
+customer and transaction tables (UUID strings, Decimal amounts, dates and
+datetimes) and times provider.response(rows) for Flask's default provider
+and FastJSONProvider, checking that both decode to the same document.
+
+    python -m benchmarks.json_benchmark --rows 100000 --repeat 5
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider, orjson
+
+
+def make_rows(count):
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        if i % 2:
+            rows.append({
+                'transaction_id': str(uuid.uuid4()),
+                'from_account_id': str(uuid.uuid4()),
+                'to_account_id': str(uuid.uuid4()),
+                'transaction_type': 'TRANSFER',
+                'amount': Decimal(i % 100000) / 100,
+                'transaction_timestamp': start + timedelta(seconds=i),
+            })
+        else:
+            rows.append({
+                'customer_id': str(uuid.uuid4()),
+                'first_name': 'faruk',
+                'last_name': 'oz',
+                'date_of_birth': date(1990, 1, 1) + timedelta(days=i % 10000),
+                'phone_number': f'{5550000000 + i}',
+                'email': f'customer{i}@example.com',
+                'address_line1': 'katar cd',
+                'address_line2': None,
+                'city': 'istanbul',
+                'zip_code': '54321',
+                'wage_declaration': Decimal('50000.00'),
+            })
+    return rows
+
+
+def measure(app, provider, rows, repeat):
+    app.json = provider
+    timings = []
+    with app.app_context():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = provider.response(rows).get_data()
+            timings.append(time.perf_counter() - started)
+    return timings, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed; FastJSONProvider will fall back to the standard library")
+
+    app = Flask(__name__)
+    rows = make_rows(args.rows)
+    iso = FastJSONProvider(app)
+    iso.iso_dates = True
+    providers = [
+        ('flask default', DefaultJSONProvider(app)),
+        ('fast', FastJSONProvider(app)),
+        ('fast, iso dates', iso),
+    ]
+
+    print(f"{args.rows} rows, best and median of {args.repeat}")
+    baseline = reference = None
+    for label, provider in providers:
+        timings, body = measure(app, provider, rows, args.repeat)
+        best = min(timings)
+        baseline = baseline or best
+        if reference is None:
+            reference = json.loads(body)
+        elif not getattr(provider, 'iso_dates', False):
+            assert json.loads(body) == reference, f"{label} output differs from the default provider"
+        print(f"  {label:>16}: {best * 1000:8.1f} ms best, {statistics.median(timings) * 1000:8.1f} ms median, "
+              f"{len(body) / 1e6:6.1f} MB  x{baseline / best:.2f}")
+
+
+if __name__ == '__main__':
+    main()
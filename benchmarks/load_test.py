@@ -0,0 +1,333 @@
+"""
+End-to-end load test of the API: seeds a dataset, then drives the real
+blueprints at a fixed concurrency and reports throughput and latency
+percentiles per scenario.
+
+Scenarios:
+
+  login            POST /auth/login as a random seeded user
+  money_transfer   POST /transaction/money_transfer between seeded accounts
+  transactions     GET /transaction/transactions, first page
+  account_history  GET /transaction/accounts/<id>/transactions for a random account
+  customers        GET /customer/customers, first page
+  high_totals      GET /transaction/high_transactions/<min>
+  branches         GET /branch/branches_with_conditions
+
+Requests go through the Flask test client by default, or over HTTP to a
+local threaded WSGI server with --server. The database is DB_BACKEND as
+usual, except that it defaults to an in-memory SQLite database here; point
+it at a scratch MySQL database, never a real one, since the schema is
+migrated and test data added. Login throttling is lifted so that the
+login scenario measures the handler rather than the rate limiter.
+
+Save a run with --output and compare later runs against it with
+--baseline; the exit status is 1 if any scenario's p95 latency or
+throughput is more than --tolerance worse than the baseline.
+
+    python -m benchmarks.load_test --customers 500 --concurrency 8 --duration 10 --output baseline.json
+    python -m benchmarks.load_test --customers 500 --concurrency 8 --duration 10 --baseline baseline.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+if os.environ['DB_BACKEND'] == 'sqlite':
+    os.environ.setdefault('SQLITE_PATH', ':memory:')
+
+import database
+import passwords
+
+SCENARIOS = ('login', 'money_transfer', 'transactions', 'account_history', 'customers', 'high_totals', 'branches')
+PASSWORD = 'loadtest-password'
+CUSTOMERS_PER_BRANCH = 50
+EMPLOYEES_PER_BRANCH = 3
+
+
+def seed(customers, accounts_per_customer, transactions, rng):
+    """Insert a dataset with a fresh name prefix and return what the scenarios need to address it."""
+    run = f"lt{rng.randrange(16 ** 6):06x}"
+    phone = rng.randrange(10 ** 5) * 10 ** 7
+    password_hash = passwords.hash_password(PASSWORD)
+    created = datetime.now().replace(microsecond=0)
+
+    branch_rows = [(str(uuid.uuid4()), f"{run} branch {i}", 'main st', None, 'istanbul', '34000', str(phone + i))
+                   for i in range(customers // CUSTOMERS_PER_BRANCH + 1)]
+    employee_rows = [(str(uuid.uuid4()), branch[0], 'emp', str(i), 'teller', created, str(phone + i),
+                      f"{run}.employee{i}@example.com")
+                     for i, branch in enumerate(branch_rows * EMPLOYEES_PER_BRANCH)]
+    customer_rows = [(str(uuid.uuid4()), 'load', str(i), '1990-01-01', str(phone + i), f"{run}.customer{i}@example.com",
+                      'main st', None, 'istanbul', '34000', Decimal('50000.00'))
+                     for i in range(customers)]
+    user_rows = [(str(uuid.uuid4()), f"{run}_user{i}", password_hash, 'USER', customer[0])
+                 for i, customer in enumerate(customer_rows)]
+    user_rows.append((str(uuid.uuid4()), f"{run}_admin", password_hash, 'ADMIN', None))
+    account_rows = [(str(uuid.uuid4()), customer[0], rng.choice(('CHECKING', 'SAVINGS')), Decimal('1000000.00'),
+                     created, branch_rows[i // CUSTOMERS_PER_BRANCH][0])
+                    for i, customer in enumerate(customer_rows) for _ in range(accounts_per_customer)]
+    transaction_rows = []
+    for _ in range(transactions):
+        from_account, to_account = rng.sample(account_rows, 2)
+        transaction_rows.append((str(uuid.uuid4()), from_account[0], to_account[0], 'TRANSFER',
+                                 Decimal(rng.randrange(1, 500000)) / 100,
+                                 created - timedelta(seconds=rng.randrange(90 * 24 * 3600))))
+
+    statements = [
+        ("INSERT INTO branch (branch_id, branch_name, address_line1, address_line2, city, zip_code, phone_number) "
+         "VALUES (%s, %s, %s, %s, %s, %s, %s)", branch_rows),
+        ("INSERT INTO employee (employee_id, branch_id, first_name, last_name, position, hire_date, phone_number, email) "
+         "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", employee_rows),
+        ("INSERT INTO customer (customer_id, first_name, last_name, date_of_birth, phone_number, email, "
+         "address_line1, address_line2, city, zip_code, wage_declaration) "
+         "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", customer_rows),
+        ("INSERT INTO user (user_id, username, password, role, customer_id) VALUES (%s, %s, %s, %s, %s)", user_rows),
+        # So a server that is already running lets the new users log in right away
+        ("INSERT INTO username_log (username, created_at) VALUES (%s, %s)", [(user[1], created) for user in user_rows]),
+        ("INSERT INTO account (account_id, customer_id, account_type, balance, creation_date, branch_id) "
+         "VALUES (%s, %s, %s, %s, %s, %s)", account_rows),
+        ("INSERT INTO transaction (transaction_id, from_account_id, to_account_id, transaction_type, amount, "
+         "transaction_timestamp) VALUES (%s, %s, %s, %s, %s, %s)", transaction_rows),
+    ]
+
+    def insert(cursor):
+        for sql, rows in statements:
+            for start in range(0, len(rows), 1000):
+                cursor.executemany(sql, rows[start:start + 1000])
+        database.rebuild_customer_transaction_totals(cursor)
+
+    database.run_in_transaction(insert)
+    return {
+        'admin': f"{run}_admin",
+        'users': [(user[1], account[0]) for user, account in zip(user_rows, account_rows[::accounts_per_customer])],
+        'accounts': [account[0] for account in account_rows],
+    }
+
+
+class TestClientTransport:
+    """Calls the app in process through Flask's test client, one client per thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Serves the app from a local threaded WSGI server and calls it over keep-alive HTTP connections."""
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class Handler(WSGIRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection('127.0.0.1', self.server.port)
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; open a new one once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+    def close(self):
+        self.server.shutdown()
+
+
+def login(transport, username):
+    status, body = transport.request('POST', '/auth/login', {'username': username, 'password': PASSWORD})
+    if status != 200:
+        raise RuntimeError(f"Login as {username} failed with {status}: {body[:200]!r}")
+    return {'Authorization': f"Bearer {json.loads(body)['access_token']}"}
+
+
+def make_scenarios(transport, data, sessions):
+    """Map each scenario name to a function of a Random that returns (method, path, body, headers)."""
+    admin = login(transport, data['admin'])
+    users = [(login(transport, username), account_id) for username, account_id in data['users'][:sessions]]
+    usernames = [username for username, _ in data['users']]
+    accounts = data['accounts']
+
+    def money_transfer(rng):
+        headers, account_id = rng.choice(users)
+        receiver = rng.choice(accounts)
+        while receiver == account_id:
+            receiver = rng.choice(accounts)
+        body = {'sender_account_id': account_id, 'receiver_account_id': receiver, 'amount': 0.01}
+        return 'POST', '/transaction/money_transfer', body, headers
+
+    return {
+        'login': lambda rng: ('POST', '/auth/login', {'username': rng.choice(usernames), 'password': PASSWORD}, None),
+        'money_transfer': money_transfer,
+        'transactions': lambda rng: ('GET', '/transaction/transactions?limit=100', None, admin),
+        'account_history': lambda rng: (
+            'GET', f"/transaction/accounts/{rng.choice(accounts)}/transactions?limit=50", None, admin),
+        'customers': lambda rng: ('GET', '/customer/customers?limit=100', None, admin),
+        'high_totals': lambda rng: ('GET', '/transaction/high_transactions/25000', None, admin),
+        'branches': lambda rng: (
+            'GET', '/branch/branches_with_conditions?min_employees=1&min_accounts=1', None, admin),
+    }
+
+
+def drive(transport, make_request, concurrency, duration, seed_value):
+    """Send requests from `concurrency` threads for `duration` seconds; return latencies and error count."""
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        own_latencies = []
+        own_errors = 0
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make_request(rng)
+            started = time.perf_counter()
+            status, _ = transport.request(method, path, body, headers)
+            own_latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                own_errors += 1
+        latencies.extend(own_latencies)
+        errors.append(own_errors)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors), time.perf_counter() - started
+
+
+def summarize(latencies, errors, elapsed):
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed,
+        'p50': cuts[49],
+        'p95': cuts[94],
+        'p99': cuts[98],
+        'max': max(latencies),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """Describe every scenario that got slower, lost throughput or started failing, compared to the baseline."""
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result['p95'] > before['p95'] * (1 + tolerance):
+            found.append(f"{name}: p95 {before['p95'] * 1000:.1f} ms -> {result['p95'] * 1000:.1f} ms")
+        if result['throughput'] < before['throughput'] * (1 - tolerance):
+            found.append(f"{name}: throughput {before['throughput']:.1f}/s -> {result['throughput']:.1f}/s")
+        if result['errors'] / result['requests'] > before['errors'] / before['requests'] + 0.01:
+            found.append(f"{name}: errors {before['errors']}/{before['requests']} -> {result['errors']}/{result['requests']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=200, help='customers (and users) to seed')
+    parser.add_argument('--accounts-per-customer', type=int, default=2)
+    parser.add_argument('--transactions', type=int, default=5000, help='historical transactions to seed')
+    parser.add_argument('--sessions', type=int, default=20, help='users logged in up front for the transfer scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=1, help='untimed seconds per scenario beforehand')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma separated subset to run')
+    parser.add_argument('--server', action='store_true', help='go through a local HTTP server instead of the test client')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the data and the request mix')
+    parser.add_argument('--output', help='write the results as JSON, e.g. to use as a baseline')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown before failing')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    rng = random.Random(args.seed)
+    database.migrate()
+    started = time.perf_counter()
+    data = seed(args.customers, args.accounts_per_customer, args.transactions, rng)
+    print(f"seeded {args.customers} customers, {args.customers * args.accounts_per_customer} accounts, "
+          f"{args.transactions} transactions into {database.DB_BACKEND} in {time.perf_counter() - started:.1f}s")
+
+    from app import app
+    import routes.auth
+    from ratelimit import TokenBucketLimiter
+    routes.auth.login_limiters = {scope: TokenBucketLimiter(10 ** 9, 10 ** 9) for scope in routes.auth.LOGIN_RATE_LIMITS}
+
+    transport = HTTPTransport(app) if args.server else TestClientTransport(app)
+    try:
+        requests = make_scenarios(transport, data, args.sessions)
+        results = {}
+        print(f"{'server' if args.server else 'test client'}, {args.concurrency} threads, {args.duration:g}s per scenario")
+        print(f"  {'scenario':>16} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name in scenarios:
+            if args.warmup:
+                drive(transport, requests[name], args.concurrency, args.warmup, args.seed)
+            result = results[name] = summarize(*drive(transport, requests[name], args.concurrency, args.duration, args.seed))
+            print(f"  {name:>16} {result['requests']:9d} {result['errors']:7d} {result['throughput']:8.1f} "
+                  f"{result['p50'] * 1000:8.2f} {result['p95'] * 1000:8.2f} {result['p99'] * 1000:8.2f} "
+                  f"{result['max'] * 1000:8.2f}")
+    finally:
+        transport.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        if found:
+            print(f"regressions beyond {args.tolerance:.0%} of the baseline:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == '__main__':
+    main()
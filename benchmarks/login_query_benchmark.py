@@ -0,0 +1,58 @@
+"""
+Cost of the login lookup: the old SELECT * through the unique username
+index against the lean column list served by idx_user_login alone.
+
+Runs against the database in DB_CONFIG; it needs at least one user.
+
+    python -m benchmarks.login_query_benchmark --runs 5000
+"""
+import argparse
+import statistics
+import time
+
+from database import get_db_connection
+from routes.auth import LOGIN_QUERY
+
+QUERIES = [
+    ('SELECT * (unique index + row)', "SELECT * FROM user WHERE username = %s"),
+    ('lean (covering index)', LOGIN_QUERY),
+]
+
+
+def measure(cursor, query, username, runs):
+    cursor.execute(f"EXPLAIN {query}", (username,))
+    plan = cursor.fetchone()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cursor.execute(query, (username,))
+        cursor.fetchone()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return plan, statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=2000, help='executions per query')
+    args = parser.parse_args()
+
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT username FROM user LIMIT 1")
+        row = cursor.fetchone()
+        if not row:
+            raise SystemExit("The user table is empty; create a user first")
+
+        for label, query in QUERIES:
+            plan, p50, p99 = measure(cursor, query, row['username'], args.runs)
+            print(f"{label:32} p50 {p50 * 1e6:8.1f} us  p99 {p99 * 1e6:8.1f} us  "
+                  f"key={plan['key']} type={plan['type']} extra={plan['Extra']}")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Login password check throughput against the number of hashing processes.
+
+Simulates a login storm: --threads request threads verify passwords as fast
+as they can for --seconds, once for every worker count from 0 (hash on the
+request thread) up to the number of cores.
+
+    python -m benchmarks.password_benchmark --threads 16 --seconds 5
+"""
+import argparse
+import os
+import threading
+import time
+
+import passwords
+
+
+def run(workers, threads, seconds, stored_hash):
+    passwords.shutdown()
+    passwords.PASSWORD_HASH_CONFIG['workers'] = workers
+    passwords.verify_password(stored_hash, 'secret123')  # start the pool outside the timed window
+
+    done = []
+    deadline = time.perf_counter() + seconds
+
+    def login_loop():
+        count = 0
+        while time.perf_counter() < deadline:
+            passwords.verify_password(stored_hash, 'secret123')
+            count += 1
+        done.append(count)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=login_loop) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(done) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='concurrent request threads')
+    parser.add_argument('--seconds', type=float, default=5, help='duration of each measurement')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    stored_hash = passwords.hash_password('secret123')
+    print(f"method {passwords.PASSWORD_HASH_CONFIG['method']}, {os.cpu_count()} cores, {args.threads} threads")
+    baseline = None
+    for workers in range(0, args.max_workers + 1):
+        rate = run(workers, args.threads, args.seconds, stored_hash)
+        baseline = baseline or rate
+        label = 'inline' if workers == 0 else f'{workers} procs'
+        print(f"  {label:>8}: {rate:8.1f} logins/s  x{rate / baseline:.2f}")
+    passwords.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+import base64
+import json
+import re
+import uuid
+from datetime import date, datetime
+
+from werkzeug.exceptions import BadRequest
+
+from database import get_db_connection, run_in_transaction
+from versions import bump
+
+# Page size bounds for the paginated listing endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BULK_ROWS = 1000
+
+_MISSING = object()
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadRequest(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def parse_fields(table, value):
+    """
+    Column tuple for ?fields=a,b,c, or None for every column.
+
+    Names are checked against the table's declared columns and returned in
+    declaration order, so equivalent requests share one cached statement.
+    """
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested - set(table.all_fields)
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(sorted(unknown))}. "
+                         f"Valid fields are: {', '.join(table.all_fields)}")
+    return tuple(name for name in table.all_fields if name in requested) or None
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps([key]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    try:
+        key, = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        return str(key)
+    except (ValueError, TypeError):
+        raise BadRequest("Invalid cursor")
+
+
+def new_id():
+    return str(uuid.uuid4())
+
+
+# Column validators: each takes the raw JSON value and returns the value to
+# store, raising BadRequest with the message the client should see.
+
+def uuid_string(message):
+    def parse(value):
+        try:
+            uuid.UUID(value)
+        except (ValueError, TypeError, AttributeError):
+            raise BadRequest(message)
+        return value
+    return parse
+
+
+def one_of(choices, message):
+    def parse(value):
+        if value not in choices:
+            raise BadRequest(message)
+        return value
+    return parse
+
+
+def matches(pattern, message):
+    def parse(value):
+        if not isinstance(value, str) or not re.match(pattern, value):
+            raise BadRequest(message)
+        return value
+    return parse
+
+
+def iso_date(message):
+    def parse(value):
+        try:
+            return date.fromisoformat(value)
+        except (ValueError, TypeError):
+            raise BadRequest(message)
+    return parse
+
+
+def iso_datetime(message):
+    def parse(value):
+        try:
+            return datetime.fromisoformat(value)
+        except (ValueError, TypeError):
+            raise BadRequest(message)
+    return parse
+
+
+class Column:
+    """
+    One column of a Table.
+
+    required columns must be present in a create payload; missing optional
+    ones take `default` (a value or a zero-argument callable). Columns that
+    are not writable are never read from a payload and always get their
+    default on create, e.g. generated keys and initial statuses. Columns
+    that are not updatable are only read from create payloads.
+    """
+
+    def __init__(self, name, parse=None, required=False, default=None, writable=True, updatable=True):
+        self.name = name
+        self.parse = parse
+        self.required = required
+        self.default = default
+        self.writable = writable
+        self.updatable = updatable
+
+    def default_value(self):
+        return self.default() if callable(self.default) else self.default
+
+
+class Table:
+    """
+    Declarative description of a table that generates and runs its CRUD SQL.
+
+    Statements are built once per (kind, column subset) and cached, so a
+    request only pays for string building the first time a given shape of
+    query is seen. Column names are only ever taken from the declaration,
+    never from the client.
+    """
+
+    def __init__(self, name, key, collection, columns, check=None):
+        self.name = name
+        self.key = key
+        self.collection = collection
+        self.columns = {column.name: column for column in columns}
+        self.all_fields = tuple(self.columns)
+        self.check = check
+        self._statements = {}
+
+    def statement(self, kind, fields=()):
+        sql = self._statements.get((kind, fields))
+        if sql is None:
+            sql = self._statements[(kind, fields)] = self._compile(kind, fields)
+        return sql
+
+    def _compile(self, kind, fields):
+        columns = ', '.join(fields)
+        if kind == 'select':
+            return f"SELECT {columns} FROM {self.name}"
+        if kind == 'get':
+            return f"SELECT {columns} FROM {self.name} WHERE {self.key} = %s"
+        if kind == 'first_page':
+            return f"SELECT {columns} FROM {self.name} ORDER BY {self.key} LIMIT %s"
+        if kind == 'next_page':
+            return f"SELECT {columns} FROM {self.name} WHERE {self.key} > %s ORDER BY {self.key} LIMIT %s"
+        if kind == 'insert':
+            placeholders = ', '.join(['%s'] * len(fields))
+            return f"INSERT INTO {self.name} ({columns}) VALUES ({placeholders})"
+        if kind == 'update':
+            assignments = ', '.join(f"{field} = %s" for field in fields)
+            return f"UPDATE {self.name} SET {assignments} WHERE {self.key} = %s"
+        if kind == 'delete':
+            return f"DELETE FROM {self.name} WHERE {self.key} = %s"
+        raise ValueError(f"Unknown statement kind: {kind}")
+
+    def parse(self, data, partial=False):
+        """
+        Validate a JSON payload into column values.
+
+        A create (partial=False) returns every column, with defaults filled
+        in and the check hook applied. An update (partial=True) returns only
+        the updatable columns present in the payload, possibly none.
+        """
+        if not isinstance(data, dict):
+            raise BadRequest("Request body must be a JSON object")
+        if not partial:
+            missing_fields = [name for name, column in self.columns.items()
+                              if column.required and column.writable and name not in data]
+            if missing_fields:
+                raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
+        values = {}
+        for name, column in self.columns.items():
+            accepted = column.writable and (column.updatable or not partial)
+            value = data.get(name, _MISSING) if accepted else _MISSING
+            if value is _MISSING:
+                if not partial:
+                    values[name] = column.default_value()
+                continue
+            values[name] = column.parse(value) if column.parse else value
+        if not partial and self.check:
+            self.check(values)
+        return values
+
+    def parse_many(self, data):
+        """Validate a bulk create payload, naming the offending row on failure."""
+        if not isinstance(data, list) or not data:
+            raise BadRequest(f"Request body must be a non-empty JSON array of {self.collection}")
+        if len(data) > MAX_BULK_ROWS:
+            raise BadRequest(f"At most {MAX_BULK_ROWS} {self.collection} can be created at once")
+        rows = []
+        for index, item in enumerate(data):
+            try:
+                rows.append(self.parse(item))
+            except BadRequest as e:
+                raise BadRequest(f"Row {index}: {e.description}")
+        return rows
+
+    def _read(self, sql, params, one=False):
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchone() if one else cursor.fetchall()
+        finally:
+            connection.close()
+
+    def get(self, key, fields=None):
+        return self._read(self.statement('get', fields or self.all_fields), (key,), one=True)
+
+    def all(self, fields=None):
+        return self._read(self.statement('select', fields or self.all_fields), ())
+
+    def page(self, limit, after=None, fields=None):
+        """
+        One keyset page in primary key order, plus the cursor for the next.
+
+        The key is always selected so the cursor can be built, and dropped
+        again from the rows if the caller didn't ask for it.
+        """
+        fields = fields or self.all_fields
+        selected = fields if self.key in fields else (self.key, *fields)
+        if after is None:
+            rows = self._read(self.statement('first_page', selected), (limit + 1,))
+        else:
+            rows = self._read(self.statement('next_page', selected), (after, limit + 1))
+        next_cursor = encode_cursor(rows[limit - 1][self.key]) if len(rows) > limit else None
+        rows = rows[:limit]
+        if selected is not fields:
+            for row in rows:
+                del row[self.key]
+        return rows, next_cursor
+
+    def _changed(self, rowcount):
+        if rowcount:
+            bump(self.name)
+        return rowcount
+
+    def insert(self, values):
+        self.insert_many([values])
+
+    def insert_many(self, rows):
+        """Insert fully parsed rows in one transaction with a single multi-row INSERT."""
+        fields = tuple(rows[0])
+        sql = self.statement('insert', fields)
+        params = [tuple(row[field] for field in fields) for row in rows]
+        run_in_transaction(lambda cursor: cursor.executemany(sql, params))
+        bump(self.name)
+
+    def update(self, key, values):
+        """Apply values to one row and return the number of rows changed."""
+        fields = tuple(values)
+        sql = self.statement('update', fields)
+        params = (*values.values(), key)
+
+        def work(cursor):
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+        return self._changed(run_in_transaction(work))
+
+    def delete(self, key):
+        """Delete one row and return the number of rows removed."""
+        sql = self.statement('delete')
+
+        def work(cursor):
+            cursor.execute(sql, (key,))
+            return cursor.rowcount
+
+        return self._changed(run_in_transaction(work))
+
+
+def list_rows(table, args):
+    """
+    Response body for a list endpoint.
+
+    Without ?limit or ?cursor this is every row, as the list endpoints have
+    always returned. With either it is one keyset page wrapped with the
+    cursor for the next page. ?fields narrows the columns either way.
+    """
+    fields = parse_fields(table, args.get('fields'))
+    if args.get('limit') is None and args.get('cursor') is None:
+        return table.all(fields)
+    limit = parse_limit(args.get('limit'))
+    after = decode_cursor(args['cursor']) if args.get('cursor') else None
+    rows, next_cursor = table.page(limit, after, fields)
+    return {table.collection: rows, 'next_cursor': next_cursor}
@@ -1,4 +1,14 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
 import pymysql.cursors
+from timing import current_timings
+
+# Storage backend: 'mysql', or 'sqlite' to run and benchmark the API without a MySQL server
+DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql')
 
 # MySQL database configuration
 DB_CONFIG = {
@@ -10,138 +20,716 @@ DB_CONFIG = {
     'cursorclass': pymysql.cursors.DictCursor
 }
 
+# SQLite database configuration, used when DB_BACKEND is 'sqlite'
+SQLITE_CONFIG = {
+    'path': os.environ.get('SQLITE_PATH', 'bank.sqlite3'),  # Or ':memory:' for a database that lives with the process
+    'timeout': 10,  # Seconds to wait for another writer before failing like a MySQL lock wait timeout
+}
+
+# MySQL errors after which the whole transaction can safely be retried
+RETRYABLE_ERROR_CODES = (
+    1213,  # ER_LOCK_DEADLOCK
+    1205,  # ER_LOCK_WAIT_TIMEOUT
+)
+
+# Secondary indexes for the hot query paths: (table, index name, columns)
+INDEXES = [
+    # Keyset pagination over all transactions
+    ('transaction', 'idx_transaction_timestamp', '(transaction_timestamp, transaction_id)'),
+    # Account history, one index per side of the transfer
+    ('transaction', 'idx_transaction_from_account', '(from_account_id, transaction_timestamp)'),
+    ('transaction', 'idx_transaction_to_account', '(to_account_id, transaction_timestamp)'),
+    # Payments of a loan in date order
+    ('loan_payment', 'idx_loan_payment_loan', '(loan_id, payment_date)'),
+    # Resolved ticket counts per employee
+    ('customer_support', 'idx_customer_support_status', '(status, employee_id)'),
+    # Covers everything login reads, so the lookup never touches the clustered index
+    ('user', 'idx_user_login', '(username, user_id, password, role)'),
+]
+
+# Connection pool configuration
+POOL_CONFIG = {
+    'min_size': 2,            # Connections opened up front and never evicted for idleness
+    'max_size': 20,           # Upper bound on open connections per process
+    'max_idle_time': 300,     # Seconds an idle connection above min_size is kept around
+    'checkout_timeout': 10,   # Seconds to wait for a free connection before giving up
+    'ping_after': 1,          # Ping connections that have been idle longer than this (seconds)
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within checkout_timeout."""
+
+class SchemaVersionError(Exception):
+    """Raised when the database schema is older than this code expects."""
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed upper bounds in seconds. Not thread-safe on its own."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'max': round(self.max, 6),
+            'avg': round(self.total / self.count, 6) if self.count else 0.0,
+            'buckets': buckets,
+        }
+
+
+class PooledConnection:
+    """
+    Proxy around a database connection checked out of a ConnectionPool.
+
+    Everything except close() is delegated to the underlying connection, so
+    existing call sites keep working. close() hands the connection back to
+    the pool instead of tearing it down, and the proxy can be used as a
+    context manager.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise AttributeError(f"Connection already returned to the pool ({name})")
+        return getattr(raw, name)
+
+    def cursor(self, *args):
+        raw = self._raw
+        if raw is None:
+            raise AttributeError("Connection already returned to the pool (cursor)")
+        cursor = raw.cursor(*args)
+        timings = current_timings.get()
+        return cursor if timings is None else TimedCursor(cursor, timings)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
+
+    def discard(self):
+        """Close the underlying connection instead of reusing it, e.g. after an abandoned streaming read."""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Handlers that return early without closing still give the slot back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class TimedCursor:
+    """
+    Proxy around a cursor that adds the time spent in each statement and
+    fetch, the statement count and the rows fetched to a RequestTimings.
+    PooledConnection only hands these out while a request is being sampled.
+    """
+
+    def __init__(self, cursor, timings):
+        self._cursor = cursor
+        self._timings = timings
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._timings.db += time.perf_counter() - started
+
+    def execute(self, query, args=None):
+        self._timings.queries += 1
+        return self._timed(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        self._timings.queries += 1
+        return self._timed(self._cursor.executemany, query, args)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._timings.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(self._cursor.fetchmany, size)
+        self._timings.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._timings.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections.
+
+    Idle connections are reused most-recently-returned first so that the
+    surplus above min_size ages out and gets closed after max_idle_time.
+    Connections idle for longer than ping_after are pinged before being
+    handed out and silently replaced if the server has gone away.
+    """
+
+    def __init__(self, connect, min_size=2, max_size=20, max_idle_time=300,
+                 checkout_timeout=10, ping_after=1):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must satisfy 0 <= min_size <= max_size and max_size >= 1")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+
+        self._idle = deque()  # (connection, returned_at) pairs, most recent on the right
+        self._size = 0        # open connections, idle and checked out
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Instrumentation, guarded by self._cond
+        self._wait_time = Histogram()
+        self._connect_time = Histogram()
+        self._counters = dict.fromkeys((
+            'checkouts', 'timeouts', 'opened', 'closed', 'idle_evictions',
+            'ping_failures', 'connect_errors', 'reset_failures',
+        ), 0)
+
+    def fill(self):
+        """Open connections until min_size are available."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            self.release(self._open(), reset=False)
+
+    def acquire(self, timeout=None):
+        """Check out a live connection, waiting up to timeout seconds for one to free up."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        stale = []
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                stale.extend(self._evict_idle())
+                if self._idle:
+                    raw, returned_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    raw, returned_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    self._wait_time.observe(time.monotonic() - started)
+                    raise PoolTimeout(f"Timed out after {timeout}s waiting for a database connection")
+                self._cond.wait(remaining)
+            self._counters['checkouts'] += 1
+            self._wait_time.observe(time.monotonic() - started)
+
+        self._close_quietly(stale)
+
+        if raw is None:
+            return self._open()
+
+        if time.monotonic() - returned_at > self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._counters['ping_failures'] += 1
+                self._close_quietly([raw])
+                return self._open()
+
+        return raw
+
+    def release(self, raw, reset=True, discard=False):
+        """Return a checked out connection, discarding it if asked to or if it can no longer be reused."""
+        reusable = raw.open and not discard
+        if reusable and reset:
+            # Drop any transaction (and read snapshot) left behind by the caller
+            try:
+                raw.rollback()
+            except Exception:
+                reusable = False
+                with self._cond:
+                    self._counters['reset_failures'] += 1
+
+        with self._cond:
+            if reusable and not self._closed:
+                self._idle.append((raw, time.monotonic()))
+                raw = None
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._close_quietly([raw])
+
+    def connection(self, timeout=None):
+        """Check out a connection wrapped in a PooledConnection."""
+        return PooledConnection(self, self.acquire(timeout))
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = [raw for raw, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_quietly(idle)
+
+    def stats(self):
+        """Snapshot of pool occupancy, checkout wait times and connection churn."""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'saturation': round((self._size - idle) / self.max_size, 4),
+                **self._counters,
+                'checkout_wait_seconds': self._wait_time.snapshot(),
+                'connect_seconds': self._connect_time.snapshot(),
+            }
+
+    def _open(self):
+        started = time.monotonic()
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._counters['connect_errors'] += 1
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters['opened'] += 1
+            self._connect_time.observe(time.monotonic() - started)
+        return raw
+
+    def _evict_idle(self):
+        # Caller holds self._cond; the oldest returned connections sit on the left
+        stale = []
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle_time:
+            stale.append(self._idle.popleft()[0])
+            self._size -= 1
+            self._counters['idle_evictions'] += 1
+        return stale
+
+    def _close_quietly(self, connections):
+        for raw in connections:
+            try:
+                raw.close()
+            except Exception:
+                pass
+        if connections:
+            with self._cond:
+                self._counters['closed'] += len(connections)
+
+
+class MySQLBackend:
+    """Connections and the few statements that differ between storage backends, for MySQL."""
+
+    name = 'mysql'
+
+    def connect(self):
+        return pymysql.connect(**DB_CONFIG)
+
+    def index_names(self, cursor):
+        cursor.execute('''
+            SELECT DISTINCT table_name AS table_name, index_name AS index_name
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+        ''')
+        return {(row['table_name'], row['index_name']) for row in cursor.fetchall()}
+
+    def lock(self, cursor, name, timeout):
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (name, timeout))
+        return bool(cursor.fetchone()['locked'])
+
+    def unlock(self, cursor, name):
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+
+
+def make_backend():
+    if DB_BACKEND == 'mysql':
+        return MySQLBackend()
+    if DB_BACKEND == 'sqlite':
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend(**SQLITE_CONFIG)
+    raise ValueError(f"Unknown DB_BACKEND: {DB_BACKEND}")
+
+backend = make_backend()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    # A forked worker must not share sockets with its parent, so each process builds its own pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                pool = ConnectionPool(backend.connect, **POOL_CONFIG)
+                pool.fill()
+                _pool = pool
+    return _pool
+
+
 def get_db_connection():
-    return pymysql.connect(**DB_CONFIG)
+    timings = current_timings.get()
+    if timings is None:
+        return get_pool().connection()
+    started = time.perf_counter()
+    try:
+        return get_pool().connection()
+    finally:
+        timings.pool += time.perf_counter() - started
+
+
+def run_in_transaction(work, retries=3, backoff=0.02):
+    """
+    Run work(cursor) inside a single transaction and commit it.
+
+    The transaction is rolled back if work raises. Deadlocks and lock wait
+    timeouts roll back and re-run work from the start, up to `retries` more
+    times, with jittered exponential backoff so hot rows don't livelock.
+    """
+    for attempt in range(retries + 1):
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                result = work(cursor)
+            connection.commit()
+            return result
+        except pymysql.err.MySQLError as e:
+            if not e.args or e.args[0] not in RETRYABLE_ERROR_CODES or attempt == retries:
+                raise
+        finally:
+            # Returning the connection to the pool rolls back anything uncommitted
+            connection.close()
+        time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+def create_schema(cursor):
+    """Migration 1: the original tables, the hot-path indexes and the transaction totals aggregate."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer (
+        customer_id CHAR(36) PRIMARY KEY,
+        first_name VARCHAR(100) NOT NULL,
+        last_name VARCHAR(100) NOT NULL,
+        date_of_birth DATE NOT NULL,
+        phone_number VARCHAR(15) UNIQUE NOT NULL,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        address_line1 VARCHAR(255) NOT NULL,
+        address_line2 VARCHAR(255),
+        city VARCHAR(100) NOT NULL,
+        zip_code VARCHAR(20) NOT NULL,
+        wage_declaration DECIMAL(15, 2) DEFAULT 0
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user (
+        user_id CHAR(36) PRIMARY KEY,
+        username VARCHAR(100) UNIQUE NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        role ENUM('ADMIN', 'USER') NOT NULL DEFAULT 'USER',
+        customer_id CHAR(36),
+        FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS branch (
+        branch_id CHAR(36) PRIMARY KEY,
+        branch_name VARCHAR(100) UNIQUE NOT NULL,
+        address_line1 VARCHAR(100) NOT NULL,
+        address_line2 VARCHAR(100),
+        city VARCHAR(100) NOT NULL,
+        zip_code VARCHAR(20) NOT NULL,
+        phone_number VARCHAR(15) UNIQUE NOT NULL
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS account (
+        account_id CHAR(36) PRIMARY KEY,
+        customer_id CHAR(36) NOT NULL,
+        account_type ENUM('CHECKING', 'SAVINGS') NOT NULL,
+        balance DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+        creation_date DATETIME NOT NULL,
+        branch_id CHAR(36) NOT NULL,
+        FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT,
+        FOREIGN KEY (branch_id) REFERENCES branch(branch_id) ON UPDATE CASCADE ON DELETE RESTRICT,
+        CONSTRAINT check_balance_positive CHECK (balance >= 0)
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS loan (
+        loan_id CHAR(36) PRIMARY KEY,
+        customer_id CHAR(36) NOT NULL,
+        loan_type ENUM('HOME', 'AUTO', 'PERSONAL') NOT NULL,
+        principal_amount DECIMAL(15, 2) NOT NULL,
+        interest_rate DECIMAL(5, 2) NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        status ENUM('ACTIVE', 'PAID_OFF', 'DEFAULT') NOT NULL,
+        FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        CONSTRAINT check_principal_positive CHECK (principal_amount > 0),
+        CONSTRAINT check_interest_non_negative CHECK (interest_rate >= 0),
+        CONSTRAINT check_dates_valid CHECK (start_date < end_date)
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS loan_payment (
+        loan_payment_id CHAR(36) PRIMARY KEY,
+        loan_id CHAR(36) NOT NULL,
+        payment_date DATETIME NOT NULL,
+        payment_amount DECIMAL(15, 2) NOT NULL,
+        remaining_balance DECIMAL(15, 2),
+        FOREIGN KEY (loan_id) REFERENCES loan(loan_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        CONSTRAINT check_payment_positive CHECK (payment_amount > 0),
+        CONSTRAINT check_remaining_non_negative CHECK (remaining_balance >= 0)
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS employee ( 
+        employee_id CHAR(36) PRIMARY KEY,
+        branch_id CHAR(36) NOT NULL,
+        first_name VARCHAR(100) NOT NULL,
+        last_name VARCHAR(100) NOT NULL,
+        position VARCHAR(100) NOT NULL,
+        hire_date DATETIME NOT NULL,
+        phone_number VARCHAR(15) NOT NULL,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        FOREIGN KEY (branch_id) REFERENCES branch(branch_id) ON UPDATE CASCADE ON DELETE RESTRICT
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS card (
+        card_id CHAR(36) PRIMARY KEY,
+        account_id CHAR(36) NOT NULL,
+        card_type ENUM('DEBIT', 'CREDIT') NOT NULL,
+        card_number VARCHAR(16) UNIQUE NOT NULL,
+        expiration_date DATE NOT NULL,
+        cvv VARCHAR(3) NOT NULL,
+        status ENUM('ACTIVE', 'BLOCKED', 'EXPIRED') NOT NULL,
+        FOREIGN KEY (account_id) REFERENCES account(account_id) ON UPDATE CASCADE ON DELETE RESTRICT
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS transaction (
+        transaction_id CHAR(36) PRIMARY KEY,
+        from_account_id CHAR(36) NOT NULL,
+        to_account_id CHAR(36),
+        transaction_type ENUM('DEPOSIT', 'WITHDRAWAL', 'TRANSFER') NOT NULL,
+        amount DECIMAL(15, 2) NOT NULL,
+        transaction_timestamp DATETIME NOT NULL,
+        FOREIGN KEY (from_account_id) REFERENCES account(account_id) ON UPDATE CASCADE ON DELETE RESTRICT,
+        FOREIGN KEY (to_account_id) REFERENCES account(account_id) ON UPDATE CASCADE ON DELETE SET NULL,
+        CONSTRAINT check_amount_positive CHECK (amount > 0)
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_support (
+        ticket_id CHAR(36) PRIMARY KEY,
+        customer_id CHAR(36) NOT NULL,
+        employee_id CHAR(36) NOT NULL,
+        issue_description TEXT NOT NULL,
+        status ENUM('OPEN', 'IN_PROGRESS', 'RESOLVED') NOT NULL,
+        created_date DATETIME NOT NULL,
+        resolved_date DATETIME,
+        FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT,
+        FOREIGN KEY (employee_id) REFERENCES employee(employee_id) ON UPDATE CASCADE ON DELETE RESTRICT
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS credit_score (
+        credit_score_id CHAR(36) PRIMARY KEY,
+        customer_id CHAR(36) NOT NULL,
+        score DECIMAL(5, 2) NOT NULL,
+        risk_category VARCHAR(50) NOT NULL,
+        computed_by_system BOOLEAN,
+        FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS customer_transaction_total (
+        customer_id CHAR(36) PRIMARY KEY,
+        total_amount DECIMAL(20, 2) NOT NULL DEFAULT 0,
+        INDEX idx_customer_transaction_total_amount (total_amount),
+        FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE CASCADE
+    );''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS idempotency_key (
+        user_id CHAR(36) NOT NULL,
+        endpoint VARCHAR(100) NOT NULL,
+        idempotency_key VARCHAR(255) NOT NULL,
+        status_code SMALLINT NOT NULL,
+        response_body TEXT NOT NULL,
+        created_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, endpoint, idempotency_key),
+        INDEX idx_idempotency_key_created (created_at)
+    );''')
+    create_indexes(cursor)
+
+    # Backfill the aggregate the first time it shows up next to existing transactions
+    cursor.execute("SELECT 1 FROM customer_transaction_total LIMIT 1")
+    if not cursor.fetchone():
+        rebuild_customer_transaction_totals(cursor)
+
+def create_username_log(cursor):
+    # Usernames as they are created or renamed, read by every worker's login filter (routes/user.py)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS username_log (
+        seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(100) NOT NULL,
+        created_at DATETIME NOT NULL,
+        INDEX idx_username_log_created (created_at)
+    );''')
 
-def init_db():
+# Schema migrations in the order they apply: (version, description, function taking a cursor).
+# Append new ones at the end, never edit one that has shipped. MySQL commits DDL implicitly,
+# so each migration should be safe to re-run if it fails halfway.
+MIGRATIONS = [
+    (1, 'Initial schema, indexes and transaction totals', create_schema),
+    (2, 'Log of created usernames', create_username_log),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(cursor):
+    """Highest migration applied to the database, 0 if it has never been migrated."""
+    try:
+        cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+    except pymysql.err.ProgrammingError as e:
+        if e.args and e.args[0] == 1146:  # ER_NO_SUCH_TABLE
+            return 0
+        raise
+    return cursor.fetchone()['version'] or 0
+
+def migrate():
+    """
+    Apply every pending migration in order, recording each in schema_version,
+    and return the (version, description) pairs applied. A named lock keeps
+    two deploys from migrating at the same time.
+    """
+    applied = []
     connection = get_db_connection()
-    with connection.cursor() as cursor:
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customer (
-            customer_id CHAR(36) PRIMARY KEY,
-            first_name VARCHAR(100) NOT NULL,
-            last_name VARCHAR(100) NOT NULL,
-            date_of_birth DATE NOT NULL,
-            phone_number VARCHAR(15) UNIQUE NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            address_line1 VARCHAR(255) NOT NULL,
-            address_line2 VARCHAR(255),
-            city VARCHAR(100) NOT NULL,
-            zip_code VARCHAR(20) NOT NULL,
-            wage_declaration DECIMAL(15, 2) DEFAULT 0
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user (
-            user_id CHAR(36) PRIMARY KEY,
-            username VARCHAR(100) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            role ENUM('ADMIN', 'USER') NOT NULL DEFAULT 'USER',
-            customer_id CHAR(36),
-            FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS branch (
-            branch_id CHAR(36) PRIMARY KEY,
-            branch_name VARCHAR(100) UNIQUE NOT NULL,
-            address_line1 VARCHAR(100) NOT NULL,
-            address_line2 VARCHAR(100),
-            city VARCHAR(100) NOT NULL,
-            zip_code VARCHAR(20) NOT NULL,
-            phone_number VARCHAR(15) UNIQUE NOT NULL
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS account (
-            account_id CHAR(36) PRIMARY KEY,
-            customer_id CHAR(36) NOT NULL,
-            account_type ENUM('CHECKING', 'SAVINGS') NOT NULL,
-            balance DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
-            creation_date DATETIME NOT NULL,
-            branch_id CHAR(36) NOT NULL,
-            FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT,
-            FOREIGN KEY (branch_id) REFERENCES branch(branch_id) ON UPDATE CASCADE ON DELETE RESTRICT,
-            CONSTRAINT check_balance_positive CHECK (balance >= 0)
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS loan (
-            loan_id CHAR(36) PRIMARY KEY,
-            customer_id CHAR(36) NOT NULL,
-            loan_type ENUM('HOME', 'AUTO', 'PERSONAL') NOT NULL,
-            principal_amount DECIMAL(15, 2) NOT NULL,
-            interest_rate DECIMAL(5, 2) NOT NULL,
-            start_date DATE NOT NULL,
-            end_date DATE NOT NULL,
-            status ENUM('ACTIVE', 'PAID_OFF', 'DEFAULT') NOT NULL,
-            FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE SET NULL,
-            CONSTRAINT check_principal_positive CHECK (principal_amount > 0),
-            CONSTRAINT check_interest_non_negative CHECK (interest_rate >= 0),
-            CONSTRAINT check_dates_valid CHECK (start_date < end_date)
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS loan_payment (
-            loan_payment_id CHAR(36) PRIMARY KEY,
-            loan_id CHAR(36) NOT NULL,
-            payment_date DATETIME NOT NULL,
-            payment_amount DECIMAL(15, 2) NOT NULL,
-            remaining_balance DECIMAL(15, 2),
-            FOREIGN KEY (loan_id) REFERENCES loan(loan_id) ON UPDATE CASCADE ON DELETE SET NULL,
-            CONSTRAINT check_payment_positive CHECK (payment_amount > 0),
-            CONSTRAINT check_remaining_non_negative CHECK (remaining_balance >= 0)
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS employee ( 
-            employee_id CHAR(36) PRIMARY KEY,
-            branch_id CHAR(36) NOT NULL,
-            first_name VARCHAR(100) NOT NULL,
-            last_name VARCHAR(100) NOT NULL,
-            position VARCHAR(100) NOT NULL,
-            hire_date DATETIME NOT NULL,
-            phone_number VARCHAR(15) NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            FOREIGN KEY (branch_id) REFERENCES branch(branch_id) ON UPDATE CASCADE ON DELETE RESTRICT
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS card (
-            card_id CHAR(36) PRIMARY KEY,
-            account_id CHAR(36) NOT NULL,
-            card_type ENUM('DEBIT', 'CREDIT') NOT NULL,
-            card_number VARCHAR(16) UNIQUE NOT NULL,
-            expiration_date DATE NOT NULL,
-            cvv VARCHAR(3) NOT NULL,
-            status ENUM('ACTIVE', 'BLOCKED', 'EXPIRED') NOT NULL,
-            FOREIGN KEY (account_id) REFERENCES account(account_id) ON UPDATE CASCADE ON DELETE RESTRICT
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transaction (
-            transaction_id CHAR(36) PRIMARY KEY,
-            from_account_id CHAR(36) NOT NULL,
-            to_account_id CHAR(36),
-            transaction_type ENUM('DEPOSIT', 'WITHDRAWAL', 'TRANSFER') NOT NULL,
-            amount DECIMAL(15, 2) NOT NULL,
-            transaction_timestamp DATETIME NOT NULL,
-            FOREIGN KEY (from_account_id) REFERENCES account(account_id) ON UPDATE CASCADE ON DELETE RESTRICT,
-            FOREIGN KEY (to_account_id) REFERENCES account(account_id) ON UPDATE CASCADE ON DELETE SET NULL,
-            CONSTRAINT check_amount_positive CHECK (amount > 0)
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customer_support (
-            ticket_id CHAR(36) PRIMARY KEY,
-            customer_id CHAR(36) NOT NULL,
-            employee_id CHAR(36) NOT NULL,
-            issue_description TEXT NOT NULL,
-            status ENUM('OPEN', 'IN_PROGRESS', 'RESOLVED') NOT NULL,
-            created_date DATETIME NOT NULL,
-            resolved_date DATETIME,
-            FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT,
-            FOREIGN KEY (employee_id) REFERENCES employee(employee_id) ON UPDATE CASCADE ON DELETE RESTRICT
-        );''')
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS credit_score (
-            credit_score_id CHAR(36) PRIMARY KEY,
-            customer_id CHAR(36) NOT NULL,
-            score DECIMAL(5, 2) NOT NULL,
-            risk_category VARCHAR(50) NOT NULL,
-            computed_by_system BOOLEAN,
-            FOREIGN KEY (customer_id) REFERENCES customer(customer_id) ON UPDATE CASCADE ON DELETE RESTRICT
-        );''')
-    connection.commit()
-    connection.close()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at DATETIME NOT NULL
+            );''')
+            if not backend.lock(cursor, 'schema_migration', 300):
+                raise SchemaVersionError("Timed out waiting for another migration to finish")
+            try:
+                current = get_schema_version(cursor)
+                for version, description, apply in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    apply(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                        (version, description, datetime.now())
+                    )
+                    connection.commit()
+                    applied.append((version, description))
+            finally:
+                backend.unlock(cursor, 'schema_migration')
+    finally:
+        connection.close()
+    return applied
+
+def check_schema():
+    """
+    Make sure the database has been migrated at least to SCHEMA_VERSION,
+    with a single query and no DDL, so booting a web worker takes no
+    metadata locks. Newer databases are fine; migrations only add.
+    """
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            version = get_schema_version(cursor)
+    finally:
+        connection.close()
+    if version < SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is at version {version} but this code needs {SCHEMA_VERSION}; "
+            "run `flask --app app migrate` first"
+        )
+
+def rebuild_customer_transaction_totals(cursor):
+    # Every transaction counts towards the owner of each account it touches,
+    # the same way the old customer/account/transaction join did
+    cursor.execute("DELETE FROM customer_transaction_total")
+    cursor.execute('''
+        INSERT INTO customer_transaction_total (customer_id, total_amount)
+        SELECT A.customer_id, SUM(T.amount)
+        FROM (
+            SELECT from_account_id AS account_id, amount FROM transaction
+            UNION ALL
+            SELECT to_account_id AS account_id, amount FROM transaction
+            WHERE to_account_id IS NOT NULL AND to_account_id <> from_account_id
+        ) T
+        JOIN account A ON A.account_id = T.account_id
+        GROUP BY A.customer_id
+    ''')
+
+def create_indexes(cursor):
+    # MySQL has no CREATE INDEX IF NOT EXISTS, so look up what is already there
+    existing = backend.index_names(cursor)
+    for table, name, columns in INDEXES:
+        if (table, name) not in existing:
+            cursor.execute(f"CREATE INDEX {name} ON `{table}` {columns}")
@@ -0,0 +1,138 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pymysql
+from flask import request, jsonify
+from werkzeug.exceptions import BadRequest
+
+from cache import LRUCache
+from database import get_db_connection
+
+# Header clients set to make a write safe to retry
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# How long stored responses are kept before a key may be reused
+RETENTION = timedelta(hours=24)
+# Fraction of completed requests that afterwards purge expired keys
+PURGE_PROBABILITY = 0.01
+# Most expired keys removed by one purge
+PURGE_BATCH = 1000
+
+# Recently completed requests, so most replays never reach MySQL
+recent_responses = LRUCache(maxsize=10000, ttl=RETENTION.total_seconds())
+
+ER_DUP_ENTRY = 1062
+
+
+def get_idempotency_key():
+    """Return the request's Idempotency-Key, or None when the client did not send one."""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise BadRequest(f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+    return key
+
+
+def find_response(user_id, endpoint, key):
+    """
+    Look up the stored outcome of an earlier request with the same key.
+    Returns a Flask response tuple to replay, or None if the key is new.
+    """
+    cache_key = (user_id, endpoint, key)
+    stored = recent_responses.get(cache_key)
+    if stored is None:
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT status_code, response_body, created_at FROM idempotency_key "
+                    "WHERE user_id = %s AND endpoint = %s AND idempotency_key = %s AND created_at >= %s",
+                    (user_id, endpoint, key, datetime.now() - RETENTION)
+                )
+                row = cursor.fetchone()
+        finally:
+            connection.close()
+        if not row:
+            return None
+        stored = (json.loads(row['response_body']), row['status_code'], row['created_at'])
+        recent_responses.set(cache_key, stored)
+
+    body, status_code, created_at = stored
+    # The cache TTL runs from when the entry was cached, which may be well after the request
+    if datetime.now() - created_at > RETENTION:
+        recent_responses.pop(cache_key)
+        return None
+    response = jsonify(body)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response, status_code
+
+
+def claim_key(cursor, user_id, endpoint, key):
+    """
+    Claim a key as the first statement of the request's database transaction.
+
+    A concurrent request with the same key blocks on the primary key until
+    this transaction ends. If it commits, the other request fails with a
+    duplicate key error, which is_duplicate() recognises, before it has read
+    or locked anything, so balances are only ever touched once. If it rolls
+    back, the other request carries on as if it were the first. An expired
+    key that has not been purged yet is taken over.
+    """
+    insert = (
+        "INSERT INTO idempotency_key (user_id, endpoint, idempotency_key, status_code, response_body, created_at) "
+        "VALUES (%s, %s, %s, 0, '', %s)"
+    )
+    params = (user_id, endpoint, key, datetime.now())
+    try:
+        cursor.execute(insert, params)
+    except pymysql.err.IntegrityError as e:
+        if not is_duplicate(e):
+            raise
+        cursor.execute(
+            "DELETE FROM idempotency_key WHERE user_id = %s AND endpoint = %s AND idempotency_key = %s AND created_at < %s",
+            (user_id, endpoint, key, datetime.now() - RETENTION)
+        )
+        if not cursor.rowcount:
+            raise
+        cursor.execute(insert, params)
+
+
+def store_response(cursor, user_id, endpoint, key, body, status_code):
+    """Record the outcome of a request on the key it claimed, in the same database transaction."""
+    cursor.execute(
+        "UPDATE idempotency_key SET status_code = %s, response_body = %s "
+        "WHERE user_id = %s AND endpoint = %s AND idempotency_key = %s",
+        (status_code, json.dumps(body), user_id, endpoint, key)
+    )
+
+
+def remember_response(user_id, endpoint, key, body, status_code):
+    """
+    Cache a committed outcome so that replays are answered from memory, and
+    now and then purge expired keys, outside the request's transaction.
+    """
+    recent_responses.set((user_id, endpoint, key), (body, status_code, datetime.now()))
+    if random.random() < PURGE_PROBABILITY:
+        purge_expired()
+
+
+def purge_expired():
+    """Delete up to PURGE_BATCH keys older than RETENTION in a short transaction of their own."""
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM idempotency_key WHERE created_at < %s LIMIT %s",
+                (datetime.now() - RETENTION, PURGE_BATCH)
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def is_duplicate(error):
+    return isinstance(error, pymysql.err.IntegrityError) and error.args and error.args[0] == ER_DUP_ENTRY
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing configuration
+PASSWORD_HASH_CONFIG = {
+    'method': 'scrypt:32768:8:1',    # werkzeug method string; other stored hashes are upgraded at login
+    'salt_length': 16,
+    # Hashing processes per app worker process, 0 hashes on the request thread. Every app worker
+    # starts its own pool, so keep app workers x this at or below the CPU count.
+    'workers': min(2, os.cpu_count() or 1),
+    'timeout': 30,                   # seconds to wait for a hashing result
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+# Hashing processes are started from a clean server process (or a fresh interpreter where there
+# is none) rather than forked from a multithreaded app worker holding locks and open connections
+_mp_context = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    if PASSWORD_HASH_CONFIG['workers'] <= 0:
+        return None
+    # Like the connection pool, every process builds its own executor after a fork
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_CONFIG['workers'], mp_context=_mp_context)
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _run(fn, *args):
+    """
+    Run a CPU-heavy hashing call in the process pool, or inline when the pool is disabled.
+    Raises concurrent.futures.TimeoutError if the pool has no answer within the configured timeout.
+    """
+    global _executor
+    executor = _get_executor()
+    if executor is None:
+        return fn(*args)
+    try:
+        return executor.submit(fn, *args).result(timeout=PASSWORD_HASH_CONFIG['timeout'])
+    except BrokenProcessPool:
+        # A hashing process died; start a fresh pool next time and answer this call inline
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        return fn(*args)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_CONFIG['method'], PASSWORD_HASH_CONFIG['salt_length'])
+
+
+def verify_password(stored_hash, password):
+    return _run(check_password_hash, stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    """True if a stored hash was made with other parameters than PASSWORD_HASH_CONFIG."""
+    method, _, rest = stored_hash.partition('$')
+    salt, _, _ = rest.partition('$')
+    return method != PASSWORD_HASH_CONFIG['method'] or len(salt) != PASSWORD_HASH_CONFIG['salt_length']
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
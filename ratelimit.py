@@ -0,0 +1,124 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets kept in this process.
+
+    Each key may spend up to `capacity` tokens in a burst, refilled at
+    `refill_rate` tokens per second. A bucket that has been idle long enough
+    to be full again is indistinguishable from a new one, so such buckets are
+    swept out periodically and memory only holds recently active keys.
+    """
+
+    def __init__(self, capacity, refill_rate, max_keys=100000):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.max_keys = max_keys
+        self.ttl = self.capacity / self.refill_rate  # seconds for an empty bucket to fill up
+        self._buckets = {}  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + self.ttl
+
+    def allow(self, key, cost=1):
+        """Spend cost tokens for key. Returns (allowed, seconds until enough tokens are available)."""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep or len(self._buckets) >= self.max_keys:
+                self._sweep(now)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.capacity, now]
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (cost - tokens) / self.refill_rate
+
+    def _sweep(self, now):
+        expired = [key for key, (_, updated_at) in self._buckets.items() if now - updated_at >= self.ttl]
+        for key in expired:
+            del self._buckets[key]
+        # Still over the limit under a flood of distinct keys: forget the oldest half
+        if len(self._buckets) >= self.max_keys:
+            oldest = sorted(self._buckets, key=lambda k: self._buckets[k][1])
+            for key in oldest[:len(oldest) // 2]:
+                del self._buckets[key]
+        self._next_sweep = now + self.ttl
+
+
+class SharedTokenBucketLimiter:
+    """
+    Token buckets in a named shared memory segment, shared by every worker
+    process on the host that opens the same name.
+
+    The segment is a fixed table of `slots` entries of (tokens, updated_at),
+    addressed by a hash of the key keyed with a random secret stored at the
+    start of the segment, so clients can't pick keys that land on a given
+    slot. Keys that do collide share one bucket: the table never grows, and
+    collisions only ever err on the side of throttling. Updates are
+    serialized with flock on a lock file next to the segment.
+    """
+
+    SLOT = struct.Struct('<dd')
+    SECRET_SIZE = 16
+
+    def __init__(self, name, capacity, refill_rate, slots=65536):
+        import fcntl
+        from multiprocessing import resource_tracker, shared_memory
+
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.slots = slots
+        self._flock = fcntl.flock
+        self._lock_exclusive = fcntl.LOCK_EX
+        self._unlock = fcntl.LOCK_UN
+        self._lock_fd = os.open(os.path.join('/tmp', f'{name}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_lock = threading.Lock()
+
+        size = self.SECRET_SIZE + self.SLOT.size * slots
+        with self._locked():
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                self._shm.buf[:self.SECRET_SIZE] = os.urandom(self.SECRET_SIZE)
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+            # Outlive the process that happened to create the segment; workers come and go
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        if self._shm.size < size:
+            raise RuntimeError(f"Shared memory segment {name} has an older layout; remove /dev/shm/{name} and restart")
+        self._secret = bytes(self._shm.buf[:self.SECRET_SIZE])
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            self._flock(self._lock_fd, self._lock_exclusive)
+            try:
+                yield
+            finally:
+                self._flock(self._lock_fd, self._unlock)
+
+    def allow(self, key, cost=1):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=8, key=self._secret).digest()
+        offset = self.SECRET_SIZE + (int.from_bytes(digest, 'little') % self.slots) * self.SLOT.size
+        now = time.monotonic()  # system-wide on Linux, so comparable across processes
+
+        with self._locked():
+            tokens, updated_at = self.SLOT.unpack_from(self._shm.buf, offset)
+            if not updated_at:
+                tokens, updated_at = self.capacity, now  # never used
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.SLOT.pack_into(self._shm.buf, offset, tokens, now)
+
+        return (True, 0.0) if allowed else (False, (cost - tokens) / self.refill_rate)
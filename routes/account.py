@@ -2,8 +2,10 @@ from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 import uuid
 from datetime import datetime
+from decimal import Decimal
 from database import get_db_connection
 from .admin import admin_required
+from .transaction import update_customer_totals
 
 account_blueprint = Blueprint('account', __name__)
 
@@ -283,37 +285,46 @@ def update_account_balance(account_id):
             return jsonify({"error": "Amount is required"}), 400
 
         amount = data.get('amount')
-        if not isinstance(amount, (int, float)):
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)):
             return jsonify({"error": "Amount must be a numeric value"}), 400
 
-        # Ensure amount is a float
-        amount = float(amount)
+        # Exact cents, no float rounding
+        amount = Decimal(str(amount)).quantize(Decimal('0.01'))
 
         connection = get_db_connection()
         cursor = connection.cursor()
 
-        # Get current balance
+        # Apply the change in SQL so concurrent updates add up instead of overwriting each other;
+        # the condition keeps the balance non-negative without a separate read
+        cursor.execute(
+            "UPDATE account SET balance = balance + %s WHERE account_id = %s AND balance + %s >= 0",
+            (amount, account_id, amount)
+        )
+        updated = cursor.rowcount
+
+        # Read back the new balance; the row stays locked by the UPDATE until commit
         cursor.execute("SELECT balance FROM account WHERE account_id = %s", (account_id,))
         result = cursor.fetchone()
 
         if not result:
             return jsonify({"error": "Account not found"}), 404
 
-        # Convert current balance to float
-        current_balance = float(result['balance'])
-
-        # Calculate new balance
-        new_balance = current_balance + amount
-
-        # Ensure balance remains non-negative
-        if new_balance < 0:
+        # Nothing changed: either the funds were insufficient or the amount was zero
+        if not updated and amount != 0:
             return jsonify({"error": "Insufficient funds"}), 400
 
-        # Update balance
-        cursor.execute("UPDATE account SET balance = %s WHERE account_id = %s", (new_balance, account_id))
+        # Book the adjustment as a deposit or withdrawal in the same transaction, so the
+        # account's transactions still add up to its balance (see running_balance)
+        if amount != 0:
+            cursor.execute("""
+                INSERT INTO transaction (transaction_id, from_account_id, to_account_id, transaction_type, amount, transaction_timestamp)
+                VALUES (%s, %s, NULL, %s, %s, %s)
+            """, (str(uuid.uuid4()), account_id, 'DEPOSIT' if amount > 0 else 'WITHDRAWAL', abs(amount), datetime.now()))
+            update_customer_totals(cursor, [(account_id, None, abs(amount))])
+
         connection.commit()
 
-        return jsonify({"message": "Account balance updated successfully", "new_balance": new_balance}), 200
+        return jsonify({"message": "Account balance updated successfully", "new_balance": float(result['balance'])}), 200
 
     except Exception as e:
         # Log the exception for debugging
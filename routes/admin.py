@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from flask_jwt_extended import get_jwt, verify_jwt_in_request
 from functools import wraps
+from database import get_pool
 
 admin_blueprint = Blueprint('admin', __name__)
 
@@ -45,3 +46,70 @@ def admin_dashboard():
     """
 
     return jsonify({"message": "Welcome to the admin dashboard!"}), 200
+
+@admin_blueprint.route('/metrics', methods=['GET'])
+@admin_required
+def admin_metrics():
+    """
+    Connection pool metrics
+    ---
+    tags:
+      - Admin
+    responses:
+      200:
+        description: Occupancy, checkout wait histogram and connection churn of this worker's pool
+        schema:
+          type: object
+          properties:
+            pool:
+              type: object
+              properties:
+                size:
+                  type: integer
+                  example: 5
+                in_use:
+                  type: integer
+                  example: 3
+                idle:
+                  type: integer
+                  example: 2
+                saturation:
+                  type: number
+                  example: 0.15
+                checkouts:
+                  type: integer
+                  example: 1520
+                timeouts:
+                  type: integer
+                  example: 0
+                opened:
+                  type: integer
+                  example: 7
+                closed:
+                  type: integer
+                  example: 2
+                checkout_wait_seconds:
+                  type: object
+                  properties:
+                    count:
+                      type: integer
+                      example: 1520
+                    sum:
+                      type: number
+                      example: 0.084
+                    max:
+                      type: number
+                      example: 0.012
+                    buckets:
+                      type: object
+                      example: {"0.001": 1490, "0.005": 1515, "+Inf": 1520}
+      403:
+        description: Admin access required
+      500:
+        description: Internal server error
+    """
+
+    try:
+        return jsonify({"pool": get_pool().stats()}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
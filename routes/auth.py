@@ -1,11 +1,46 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
-from werkzeug.security import check_password_hash
+from werkzeug.security import generate_password_hash
 from database import get_db_connection
+from passwords import PASSWORD_HASH_CONFIG, hash_password, needs_rehash, verify_password
+from ratelimit import SharedTokenBucketLimiter, TokenBucketLimiter
+from .user import username_may_exist
+import math
+from concurrent.futures import TimeoutError as HashTimeoutError
 import re
 
 auth_blueprint = Blueprint('auth', __name__)
 
+# Login throttling: a burst of `capacity` attempts, then `refill_rate` attempts per second
+LOGIN_RATE_LIMITS = {
+    'username': {'capacity': 5, 'refill_rate': 5 / 60},
+    'ip': {'capacity': 20, 'refill_rate': 1},
+}
+# Name of a shared memory segment to share buckets between worker processes on one host,
+# None keeps them per process
+LOGIN_RATE_LIMIT_SHARED_MEMORY = None
+
+def make_limiter(scope):
+    limits = LOGIN_RATE_LIMITS[scope]
+    if LOGIN_RATE_LIMIT_SHARED_MEMORY:
+        return SharedTokenBucketLimiter(f"{LOGIN_RATE_LIMIT_SHARED_MEMORY}_{scope}", limits['capacity'], limits['refill_rate'])
+    return TokenBucketLimiter(limits['capacity'], limits['refill_rate'])
+
+login_limiters = {scope: make_limiter(scope) for scope in LOGIN_RATE_LIMITS}
+
+def throttle_login(username):
+    """
+    Return a 429 response if the client IP or the username is out of login attempts, else None.
+    Behind a reverse proxy the client IP needs TRUSTED_PROXIES set, see app.py.
+    """
+    for scope, key in (('ip', request.remote_addr), ('username', username.lower())):
+        allowed, retry_after = login_limiters[scope].allow(key)
+        if not allowed:
+            response = jsonify({"error": "Too many login attempts, try again later"})
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response, 429
+    return None
+
 # Login route to authenticate users
 @auth_blueprint.route('/login', methods=['POST'])
 def login():
@@ -52,6 +87,22 @@ def login():
             error:
               type: string
               example: Invalid credentials
+      429:
+        description: Too many login attempts for this username or client IP, see the Retry-After header
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: Too many login attempts, try again later
+      503:
+        description: Password checks are backed up, see the Retry-After header
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: Login is temporarily unavailable, try again later
     """
 
     data = request.get_json()
@@ -65,15 +116,41 @@ def login():
     # Example using regex to allow only alphanumeric characters and underscores
     username = re.sub(r"[^a-zA-Z0-9_]", "", username) 
 
-    # Connect to the database
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM user WHERE username = %s", (username,))
-    user = cursor.fetchone()
-    cursor.close()
-    connection.close()
+    # Turn away floods before they cost a user lookup or a password hash
+    throttled = throttle_login(username)
+    if throttled:
+        return throttled
+
+    user = None
+    # Most credential stuffing targets names that don't exist; those never reach the database
+    if username_may_exist(username):
+        # Connect to the database
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        # Only what login needs, answered from the covering index alone; without the hint MySQL
+        # prefers the unique username index and then reads the full row
+        cursor.execute(LOGIN_QUERY, (username,))
+        user = cursor.fetchone()
+        cursor.close()
+        connection.close()
+
+    try:
+        if not user:
+            # Spend the same hashing time as a wrong password so unknown names can't be told apart
+            verify_password(DUMMY_HASH, password)
+            return jsonify({"error": "Invalid credentials"}), 401
+        verified = verify_password(user['password'], password)
+    except HashTimeoutError:
+        # The hashing pool is saturated; shed the login rather than hold the request any longer
+        response = jsonify({"error": "Login is temporarily unavailable, try again later"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    if verified:
+        # Upgrade hashes made with outdated parameters while we have the plain password
+        if needs_rehash(user['password']):
+            rehash_password(user, password)
 
-    if user and check_password_hash(user['password'], password):
         # Create a JWT token
         access_token = create_access_token(
             identity=user['user_id'], 
@@ -83,6 +160,29 @@ def login():
     else:
         return jsonify({"error": "Invalid credentials"}), 401
 
+LOGIN_QUERY = "SELECT user_id, password, role FROM user FORCE INDEX (idx_user_login) WHERE username = %s"
+
+# Made at import, on this thread rather than in the hashing pool: made on first use, the first
+# unknown-user login would take a hash plus a verify and stand out from a wrong password
+DUMMY_HASH = generate_password_hash('dummy password for unknown users',
+                                    PASSWORD_HASH_CONFIG['method'], PASSWORD_HASH_CONFIG['salt_length'])
+
+def rehash_password(user, password):
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor()
+        # Only replace the hash we verified against, never a concurrent password change
+        cursor.execute(
+            "UPDATE user SET password = %s WHERE user_id = %s AND password = %s",
+            (hash_password(password), user['user_id'], user['password'])
+        )
+        connection.commit()
+        cursor.close()
+        connection.close()
+    except Exception as e:
+        # The login itself succeeded; the upgrade will be retried next time
+        current_app.logger.warning("Password rehash failed for user %s: %s", user['user_id'], e)
+
 # Protected route
 @auth_blueprint.route('/protected', methods=['GET'])
 @jwt_required()
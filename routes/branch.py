@@ -1,11 +1,22 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
-import uuid
 from database import get_db_connection
+from crud import Column, Table, list_rows, new_id, parse_fields
+from versions import conditional_get
 from .admin import admin_required
 
 branch_blueprint = Blueprint('branch', __name__)
 
+branches = Table('branch', 'branch_id', 'branches', [
+    Column('branch_id', default=new_id, writable=False),
+    Column('branch_name', required=True),
+    Column('address_line1', required=True),
+    Column('address_line2'),
+    Column('city', required=True),
+    Column('zip_code', required=True),
+    Column('phone_number', required=True),
+])
+
 # Create a new branch
 @branch_blueprint.route('/branches', methods=['POST'])
 @admin_required
@@ -61,59 +72,92 @@ def create_branch():
 
     data = request.get_json()
     try:
-        # Validate required fields
-        required_fields = ['branch_name', 'address_line1', 'city', 'zip_code', 'phone_number']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
+        values = branches.parse(data)
+        branches.insert(values)
+        return jsonify({"message": "Branch created successfully", "branch_id": values['branch_id']}), 201
 
-        # Generate unique branch ID
-        branch_id = str(uuid.uuid4())
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Prepare SQL query
-        query = """
-        INSERT INTO branch (branch_id, branch_name, address_line1, address_line2, city, zip_code, phone_number)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        params = (
-        branch_id,
-        data['branch_name'],
-        data['address_line1'],
-        data.get('address_line2', None),  # Optional field
-        data['city'],
-        data['zip_code'],
-        data['phone_number'],
-        )
-
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
-
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
-        return jsonify({"message": "Branch created successfully", "branch_id": branch_id}), 201
+# Create branches in bulk
+@branch_blueprint.route('/branches/bulk', methods=['POST'])
+@admin_required
+def create_branches_bulk():
+    """
+    Create many branches at once
+    ---
+    tags:
+      - Branches
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Array of branches with the same fields as POST /branches, at most 1000
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      201:
+        description: Branches created successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: Branches created successfully
+            branch_ids:
+              type: array
+              items:
+                type: string
+      400:
+        description: Validation error, naming the first invalid row
+      500:
+        description: Internal server error
+    """
+
+    data = request.get_json()
+    try:
+        rows = branches.parse_many(data)
+        branches.insert_many(rows)
+        return jsonify({"message": "Branches created successfully", "branch_ids": [row['branch_id'] for row in rows]}), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
-    
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Get all branches
 @branch_blueprint.route('/branches', methods=['GET'])
 @admin_required
+@conditional_get(branches.name)
 def get_branches():
     """
     Get all branches
     ---
     tags:
       - Branches
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        maximum: 1000
+        description: Page size; with limit or cursor the response is one page wrapped with next_cursor
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. branch_id,branch_name,city
     responses:
       200:
         description: List of all branches
@@ -143,19 +187,17 @@ def get_branches():
               phone_number:
                 type: string
                 example: 1234567890
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM branch")
-        branches = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        return jsonify(list_rows(branches, request.args)), 200
 
-        return jsonify(branches), 200
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -163,6 +205,7 @@ def get_branches():
 # Get a specific branch by ID
 @branch_blueprint.route('/branches/<branch_id>', methods=['GET'])
 @admin_required
+@conditional_get(branches.name)
 def get_branch(branch_id):
     """
     Get a specific branch by ID
@@ -175,6 +218,11 @@ def get_branch(branch_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174000
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. branch_id,branch_name,city
     responses:
       200:
         description: Branch details
@@ -204,23 +252,22 @@ def get_branch(branch_id):
               example: 1234567890
       404:
         description: Branch not found
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM branch WHERE branch_id = %s", (branch_id,))
-        branch = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
+        branch = branches.get(branch_id, parse_fields(branches, request.args.get('fields')))
         if not branch:
             return jsonify({"error": "Branch not found"}), 404
 
         return jsonify(branch), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -282,54 +329,18 @@ def update_branch(branch_id):
 
     data = request.get_json()
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare update statements
-        updates = []
-        params = []
-        if 'branch_name' in data:
-            updates.append("branch_name = %s")
-            params.append(data['branch_name'])
-        if 'address_line1' in data:
-            updates.append("address_line1 = %s")
-            params.append(data['address_line1'])
-        if 'address_line2' in data:
-            updates.append("address_line2 = %s")
-            params.append(data['address_line2'])
-        if 'city' in data:
-            updates.append("city = %s")
-            params.append(data['city'])
-        if 'zip_code' in data:
-            updates.append("zip_code = %s")
-            params.append(data['zip_code'])
-        if 'phone_number' in data:
-            updates.append("phone_number = %s")
-            params.append(data['phone_number'])
-
-        if not updates:
+        values = branches.parse(data, partial=True)
+        if not values:
             return jsonify({"error": "No valid fields to update"}), 400
 
-        # Construct the SQL UPDATE query with a placeholder for the WHERE clause
-        query = f"UPDATE branch SET {', '.join(updates)} WHERE branch_id = %s"
-
-        # Add branch_id to the end of the params list
-        params.append(branch_id)
-        # Execute the query and commit changes
-        
-        cursor.execute(query, tuple(params))
-        connection.commit()
-
-        # Check if any rows were affected
-        if cursor.rowcount == 0:
+        if branches.update(branch_id, values) == 0:
             return jsonify({"error": "Branch not found"}), 404
 
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Branch updated successfully"}), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -364,22 +375,14 @@ def delete_branch(branch_id):
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM branch WHERE branch_id = %s", (branch_id,))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if branches.delete(branch_id) == 0:
             return jsonify({"error": "Branch not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Branch deleted successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    
+
 def get_branches_with_conditions(min_employees: int = 5, min_accounts: int = 3):
     """
     Get branches with specific conditions
@@ -1,13 +1,26 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 import uuid
-from datetime import date
-from database import get_db_connection
+from crud import Column, Table, iso_date, list_rows, new_id, one_of, parse_fields
+from versions import conditional_get
 from .admin import admin_required
 import re
 
 card_blueprint = Blueprint('card', __name__)
 
+def sanitize_card_number(card_number):
+    return re.sub(r"[^0-9-]", "", card_number)
+
+cards = Table('card', 'card_id', 'cards', [
+    Column('card_id', default=new_id, writable=False),
+    Column('account_id', required=True),
+    Column('card_type', one_of(['DEBIT', 'CREDIT'], "Invalid card type. Valid types are: DEBIT, CREDIT"), required=True),
+    Column('card_number', sanitize_card_number, required=True),
+    Column('expiration_date', iso_date("Invalid expiration date format. Use YYYY-MM-DD."), required=True),
+    Column('cvv', required=True),
+    Column('status', default='ACTIVE', writable=False),
+])
+
 # Create a new card
 @card_blueprint.route('/cards', methods=['POST'])
 @admin_required
@@ -63,71 +76,92 @@ def create_card():
 
     data = request.get_json()
     try:
-        # Validate required fields
-        required_fields = ['account_id', 'card_type', 'card_number', 'expiration_date', 'cvv']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
-
-        # Validate card type
-        valid_card_types = ['DEBIT', 'CREDIT']
-        if data['card_type'] not in valid_card_types:
-            raise BadRequest(f"Invalid card type. Valid types are: {', '.join(valid_card_types)}")
-
-        # Validate expiration date (basic check)
-        try:
-            expiration_date = date.fromisoformat(data['expiration_date'])
-        except ValueError:
-            raise BadRequest("Invalid expiration date format. Use YYYY-MM-DD.")
-
-        # Generate unique card ID
-        card_id = str(uuid.uuid4())
-
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        card_number = data['card_number']
-        sanitized_card_number = re.sub(r"[^0-9-]", "", card_number) 
-
-        # Prepare SQL query
-        query = """
-        INSERT INTO card (card_id, account_id, card_type, card_number, expiration_date, cvv, status)
-        VALUES (%s, %s, %s, %s, %s, %s, 'ACTIVE')
-        """
-        params = (
-        card_id,
-        data['account_id'],
-        data['card_type'],
-        sanitized_card_number,
-        expiration_date,
-        data['cvv'],
-        )
-
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
-
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
-        return jsonify({"message": "Card created successfully", "card_id": card_id}), 201
+        values = cards.parse(data)
+        cards.insert(values)
+        return jsonify({"message": "Card created successfully", "card_id": values['card_id']}), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Create cards in bulk
+@card_blueprint.route('/cards/bulk', methods=['POST'])
+@admin_required
+def create_cards_bulk():
+    """
+    Create many cards at once
+    ---
+    tags:
+      - Cards
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Array of cards with the same fields as POST /cards, at most 1000
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      201:
+        description: Cards created successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: Cards created successfully
+            card_ids:
+              type: array
+              items:
+                type: string
+      400:
+        description: Validation error, naming the first invalid row
+      500:
+        description: Internal server error
+    """
+
+    data = request.get_json()
+    try:
+        rows = cards.parse_many(data)
+        cards.insert_many(rows)
+        return jsonify({"message": "Cards created successfully", "card_ids": [row['card_id'] for row in rows]}), 201
+
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Get all cards
 @card_blueprint.route('/cards', methods=['GET'])
 @admin_required
+@conditional_get(cards.name)
 def get_cards():
     """
     Get all cards
     ---
     tags:
       - Cards
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        maximum: 1000
+        description: Page size; with limit or cursor the response is one page wrapped with next_cursor
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. card_id,card_type,status
     responses:
       200:
         description: List of all cards
@@ -157,19 +191,17 @@ def get_cards():
               status:
                 type: string
                 example: ACTIVE
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM card")
-        cards = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        return jsonify(list_rows(cards, request.args)), 200
 
-        return jsonify(cards), 200
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -177,6 +209,7 @@ def get_cards():
 # Get a specific card by ID
 @card_blueprint.route('/cards/<card_id>', methods=['GET'])
 @admin_required
+@conditional_get(cards.name)
 def get_card(card_id):
     """
     Get a specific card by ID
@@ -189,6 +222,11 @@ def get_card(card_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174001
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. card_id,card_type,status
     responses:
       200:
         description: Card details
@@ -218,6 +256,8 @@ def get_card(card_id):
               example: ACTIVE
       404:
         description: Card not found
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
@@ -228,18 +268,15 @@ def get_card(card_id):
         except ValueError:
             return jsonify({'error': 'Invalid card_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM card WHERE card_id = %s", (card_id,))
-        card = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
+        card = cards.get(card_id, parse_fields(cards, request.args.get('fields')))
         if not card:
             return jsonify({"error": "Card not found"}), 404
 
         return jsonify(card), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -299,18 +336,9 @@ def update_card_status(card_id):
         if data['status'] not in valid_statuses:
             return jsonify({"error": "Invalid status. Valid statuses are: {', '.join(valid_statuses)}"}), 400
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        cursor.execute("UPDATE card SET status = %s WHERE card_id = %s", (data['status'], card_id))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if cards.update(card_id, {'status': data['status']}) == 0:
             return jsonify({"error": "Card not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Card status updated successfully"}), 200
 
     except Exception as e:
@@ -352,17 +380,9 @@ def delete_card(card_id):
         except ValueError:
             return jsonify({'error': 'Invalid card_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM card WHERE card_id = %s", (card_id,))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if cards.delete(card_id) == 0:
             return jsonify({"error": "Card not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Card deleted successfully"}), 200
 
     except Exception as e:
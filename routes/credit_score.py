@@ -1,11 +1,20 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 import uuid
-from database import get_db_connection
+from crud import Column, Table, list_rows, new_id, parse_fields
+from versions import conditional_get
 from .admin import admin_required
 
 credit_score_blueprint = Blueprint('credit_score', __name__)
 
+credit_scores = Table('credit_score', 'credit_score_id', 'credit_scores', [
+    Column('credit_score_id', default=new_id, writable=False),
+    Column('customer_id', required=True, updatable=False),
+    Column('score', required=True),
+    Column('risk_category', required=True),
+    Column('computed_by_system', default=False),
+])
+
 # Create a new credit score
 @credit_score_blueprint.route('/credit_scores', methods=['POST'])
 @admin_required
@@ -54,59 +63,92 @@ def create_credit_score():
 
     data = request.get_json()
     try:
-        # Validate required fields
-        required_fields = ['customer_id', 'score', 'risk_category']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
-
-        # Generate unique credit score ID
-        credit_score_id = str(uuid.uuid4())
-
-        # Set computed_by_system to False by default
-        computed_by_system = data.get('computed_by_system', False)
-
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare SQL query
-        query = """
-        INSERT INTO credit_score (credit_score_id, customer_id, score, risk_category, computed_by_system)
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        params = (
-        credit_score_id,
-        data['customer_id'],
-        data['score'],
-        data['risk_category'],
-        computed_by_system,
-        )
-
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
-
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
-        return jsonify({"message": "Credit score created successfully", "credit_score_id": credit_score_id}), 201
+        values = credit_scores.parse(data)
+        credit_scores.insert(values)
+        return jsonify({"message": "Credit score created successfully", "credit_score_id": values['credit_score_id']}), 201
+
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Create credit scores in bulk
+@credit_score_blueprint.route('/credit_scores/bulk', methods=['POST'])
+@admin_required
+def create_credit_scores_bulk():
+    """
+    Create many credit scores at once
+    ---
+    tags:
+      - Credit Scores
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Array of credit scores with the same fields as POST /credit_scores, at most 1000
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      201:
+        description: Credit scores created successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: Credit scores created successfully
+            credit_score_ids:
+              type: array
+              items:
+                type: string
+      400:
+        description: Validation error, naming the first invalid row
+      500:
+        description: Internal server error
+    """
+
+    data = request.get_json()
+    try:
+        rows = credit_scores.parse_many(data)
+        credit_scores.insert_many(rows)
+        return jsonify({"message": "Credit scores created successfully", "credit_score_ids": [row['credit_score_id'] for row in rows]}), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Get all credit scores
 @credit_score_blueprint.route('/credit_scores', methods=['GET'])
 @admin_required
+@conditional_get(credit_scores.name)
 def get_credit_scores():
     """
     Get all credit scores
     ---
     tags:
       - Credit Scores
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        maximum: 1000
+        description: Page size; with limit or cursor the response is one page wrapped with next_cursor
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. credit_score_id,score
     responses:
       200:
         description: List of all credit scores
@@ -130,19 +172,17 @@ def get_credit_scores():
               computed_by_system:
                 type: boolean
                 example: false
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM credit_score")
-        credit_scores = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        return jsonify(list_rows(credit_scores, request.args)), 200
 
-        return jsonify(credit_scores), 200
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -150,6 +190,7 @@ def get_credit_scores():
 # Get a specific credit score by ID
 @credit_score_blueprint.route('/credit_scores/<credit_score_id>', methods=['GET'])
 @admin_required
+@conditional_get(credit_scores.name)
 def get_credit_score(credit_score_id):
     """
     Get a specific credit score by ID
@@ -162,6 +203,11 @@ def get_credit_score(credit_score_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174001
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. credit_score_id,score
     responses:
       200:
         description: Credit score details
@@ -185,6 +231,8 @@ def get_credit_score(credit_score_id):
               example: false
       404:
         description: Credit score not found
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
@@ -195,18 +243,15 @@ def get_credit_score(credit_score_id):
         except ValueError:
             return jsonify({'error': 'Invalid credit_score_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM credit_score WHERE credit_score_id = %s", (credit_score_id,))
-        credit_score = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
+        credit_score = credit_scores.get(credit_score_id, parse_fields(credit_scores, request.args.get('fields')))
         if not credit_score:
             return jsonify({"error": "Credit score not found"}), 404
 
         return jsonify(credit_score), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -264,45 +309,18 @@ def update_credit_score(credit_score_id):
         except ValueError:
             return jsonify({'error': 'Invalid credit_score_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare update statements
-        updates = []
-        params = []
-        if 'score' in data:
-            updates.append("score = %s")
-            params.append(data['score'])
-        if 'risk_category' in data:
-            updates.append("risk_category = %s")
-            params.append(data['risk_category'])
-        if 'computed_by_system' in data:
-            updates.append("computed_by_system = %s")
-            params.append(data['computed_by_system'])
-
-        if not updates:
+        values = credit_scores.parse(data, partial=True)
+        if not values:
             return jsonify({"error": "No valid fields to update"}), 400
 
-        # Add credit_score_id to the end of the params list
-        params.append(credit_score_id)
-
-        # Construct the SQL UPDATE query
-        query = f"UPDATE credit_score SET {', '.join(updates)} WHERE credit_score_id = %s"
-
-        # Execute the query and commit changes
-        cursor.execute(query, tuple(params))
-        connection.commit()
-
-        # Check if any rows were affected
-        if cursor.rowcount == 0:
+        if credit_scores.update(credit_score_id, values) == 0:
             return jsonify({"error": "Credit score not found"}), 404
 
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Credit score updated successfully"}), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -342,17 +360,9 @@ def delete_credit_score(credit_score_id):
         except ValueError:
             return jsonify({'error': 'Invalid credit_score_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM credit_score WHERE credit_score_id = %s", (credit_score_id,))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if credit_scores.delete(credit_score_id) == 0:
             return jsonify({"error": "Credit score not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Credit score deleted successfully"}), 200
 
     except Exception as e:
@@ -1,11 +1,26 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 import uuid
-from database import get_db_connection
+from crud import Column, Table, list_rows, new_id, parse_fields
+from versions import conditional_get
 from .admin import admin_required
 
 customer_blueprint = Blueprint('customer', __name__)
 
+customers = Table('customer', 'customer_id', 'customers', [
+    Column('customer_id', default=new_id, writable=False),
+    Column('first_name', required=True),
+    Column('last_name', required=True),
+    Column('date_of_birth', required=True),
+    Column('phone_number', required=True),
+    Column('email', required=True),
+    Column('address_line1', required=True),
+    Column('address_line2'),
+    Column('city', required=True),
+    Column('zip_code', required=True),
+    Column('wage_declaration', default=0.0),
+])
+
 # create a new customer
 @customer_blueprint.route('/customers', methods=['POST'])
 @admin_required
@@ -75,63 +90,92 @@ def create_customer():
 
     data = request.get_json()
     try:
-        # Validate required fields
-        required_fields = ['first_name', 'last_name', 'date_of_birth', 'phone_number', 'email', 'address_line1', 'city', 'zip_code']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
-
-        # Generate unique customer ID
-        customer_id = str(uuid.uuid4())
-
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare SQL query
-        query = """
-            INSERT INTO customer (customer_id, first_name, last_name, date_of_birth, phone_number, email, address_line1, address_line2, city, zip_code, wage_declaration)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        params = (
-            customer_id,
-            data['first_name'],
-            data['last_name'],
-            data['date_of_birth'],
-            data['phone_number'],
-            data['email'],
-            data['address_line1'],
-            data.get('address_line2', None),  # Optional field
-            data['city'],
-            data['zip_code'],
-            data.get('wage_declaration', 0.0),  # Optional field with default value
-        )
-
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
-
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
-        return jsonify({"message": "Customer created successfully", "customer_id": customer_id}), 201
+        values = customers.parse(data)
+        customers.insert(values)
+        return jsonify({"message": "Customer created successfully", "customer_id": values['customer_id']}), 201
+
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Create customers in bulk
+@customer_blueprint.route('/customers/bulk', methods=['POST'])
+@admin_required
+def create_customers_bulk():
+    """
+    Create many customers at once
+    ---
+    tags:
+      - Customers
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Array of customers with the same fields as POST /customers, at most 1000
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      201:
+        description: Customers created successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: Customers created successfully
+            customer_ids:
+              type: array
+              items:
+                type: string
+      400:
+        description: Validation error, naming the first invalid row
+      500:
+        description: Internal server error
+    """
+
+    data = request.get_json()
+    try:
+        rows = customers.parse_many(data)
+        customers.insert_many(rows)
+        return jsonify({"message": "Customers created successfully", "customer_ids": [row['customer_id'] for row in rows]}), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
-    
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Get all customers
 @customer_blueprint.route('/customers', methods=['GET'])
 @admin_required
+@conditional_get(customers.name)
 def get_customers():
     """
     Get all customers
     ---
     tags:
       - Customers
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        maximum: 1000
+        description: Page size; with limit or cursor the response is one page wrapped with next_cursor
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. customer_id,first_name,last_name
     responses:
       200:
         description: List of all customers
@@ -173,19 +217,17 @@ def get_customers():
               wage_declaration:
                 type: number
                 example: 50000.00
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM customer")
-        customers = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        return jsonify(list_rows(customers, request.args)), 200
 
-        return jsonify(customers), 200
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -193,6 +235,7 @@ def get_customers():
 # Get a specific customer by ID
 @customer_blueprint.route('/customers/<customer_id>', methods=['GET'])
 @admin_required
+@conditional_get(customers.name)
 def get_customer(customer_id):
     """
     Get a specific customer by ID
@@ -205,6 +248,11 @@ def get_customer(customer_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174000
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. customer_id,first_name,last_name
     responses:
       200:
         description: Customer details
@@ -246,6 +294,8 @@ def get_customer(customer_id):
               example: 50000.00
       404:
         description: Customer not found
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
@@ -256,18 +306,15 @@ def get_customer(customer_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for customer_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM customer WHERE customer_id = %s", (customer_id,))
-        customer = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
+        customer = customers.get(customer_id, parse_fields(customers, request.args.get('fields')))
         if not customer:
             return jsonify({"error": "Customer not found"}), 404
 
         return jsonify(customer), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -347,66 +394,18 @@ def update_customer(customer_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for customer_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare update statements
-        updates = []
-        params = []
-        if 'first_name' in data:
-            updates.append("first_name = %s")
-            params.append(data['first_name'])
-        if 'last_name' in data:
-            updates.append("last_name = %s")
-            params.append(data['last_name'])
-        if 'date_of_birth' in data:
-            updates.append("date_of_birth = %s")
-            params.append(data['date_of_birth'])
-        if 'phone_number' in data:
-            updates.append("phone_number = %s")
-            params.append(data['phone_number'])
-        if 'email' in data:
-            updates.append("email = %s")
-            params.append(data['email'])
-        if 'address_line1' in data:
-            updates.append("address_line1 = %s")
-            params.append(data['address_line1'])
-        if 'address_line2' in data:
-            updates.append("address_line2 = %s")
-            params.append(data['address_line2'])
-        if 'city' in data:
-            updates.append("city = %s")
-            params.append(data['city'])
-        if 'zip_code' in data:
-            updates.append("zip_code = %s")
-            params.append(data['zip_code'])
-        if 'wage_declaration' in data:
-            updates.append("wage_declaration = %s")
-            params.append(data['wage_declaration'])
-
-        if not updates:
+        values = customers.parse(data, partial=True)
+        if not values:
             return jsonify({"error": "No valid fields to update"}), 400
 
-        # Add customer_id to the end of the params list
-        params.append(customer_id)
-
-        # Construct the SQL UPDATE query
-        query = f"UPDATE customer SET {', '.join(updates)} WHERE customer_id = %s"
-
-        # Execute the query and commit changes
-        cursor.execute(query, tuple(params))
-        connection.commit()
-
-        # Check if any rows were affected
-        if cursor.rowcount == 0:
+        if customers.update(customer_id, values) == 0:
             return jsonify({"error": "Customer not found"}), 404
 
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Customer updated successfully"}), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -446,17 +445,9 @@ def delete_customer(customer_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for customer_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM customer WHERE customer_id = %s", (customer_id,))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if customers.delete(customer_id) == 0:
             return jsonify({"error": "Customer not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Customer deleted successfully"}), 200
 
     except Exception as e:
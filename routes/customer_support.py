@@ -3,10 +3,22 @@ from werkzeug.exceptions import BadRequest
 import uuid
 from datetime import datetime
 from database import get_db_connection
+from crud import Column, Table, list_rows, new_id, parse_fields, uuid_string
+from versions import conditional_get
 from .admin import admin_required
 
 customer_support_blueprint = Blueprint('customer_support', __name__)
 
+tickets = Table('customer_support', 'ticket_id', 'tickets', [
+    Column('ticket_id', default=new_id, writable=False),
+    Column('customer_id', uuid_string('Invalid UUID for customer_id or employee_id'), required=True),
+    Column('employee_id', uuid_string('Invalid UUID for customer_id or employee_id'), required=True),
+    Column('issue_description', required=True),
+    Column('status', default='OPEN', writable=False),
+    Column('created_date', default=datetime.now, writable=False),
+    Column('resolved_date', writable=False),
+])
+
 # Create a new support ticket
 @customer_support_blueprint.route('/tickets', methods=['POST'])
 @admin_required
@@ -52,65 +64,92 @@ def create_ticket():
 
     data = request.get_json()
     try:
-        # Validate required fields
-        required_fields = ['customer_id', 'employee_id', 'issue_description']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
-
-        try:
-            uuid.UUID(data['customer_id'])
-            uuid.UUID(data['employee_id'])
-        except ValueError:
-            return jsonify({'error': 'Invalid UUID for customer_id or employee_id'})
-
-        # Get current date and time
-        created_date = datetime.now()
-
-        # Generate unique ticket ID
-        ticket_id = str(uuid.uuid4())
-
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
+        values = tickets.parse(data)
+        tickets.insert(values)
+        return jsonify({"message": "Ticket created successfully", "ticket_id": values['ticket_id']}), 201
 
-        # Prepare SQL query
-        query = """
-        INSERT INTO customer_support (ticket_id, customer_id, employee_id, issue_description, status, created_date, resolved_date)
-        VALUES (%s, %s, %s, %s, 'OPEN', %s, NULL)
-        """
-        params = (
-        ticket_id,
-        data['customer_id'],
-        data['employee_id'],
-        data['issue_description'],
-        created_date,
-        )
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
+# Create tickets in bulk
+@customer_support_blueprint.route('/tickets/bulk', methods=['POST'])
+@admin_required
+def create_tickets_bulk():
+    """
+    Create many tickets at once
+    ---
+    tags:
+      - Customer Support
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Array of tickets with the same fields as POST /tickets, at most 1000
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      201:
+        description: Tickets created successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: Tickets created successfully
+            ticket_ids:
+              type: array
+              items:
+                type: string
+      400:
+        description: Validation error, naming the first invalid row
+      500:
+        description: Internal server error
+    """
 
-        return jsonify({"message": "Ticket created successfully", "ticket_id": ticket_id}), 201
+    data = request.get_json()
+    try:
+        rows = tickets.parse_many(data)
+        tickets.insert_many(rows)
+        return jsonify({"message": "Tickets created successfully", "ticket_ids": [row['ticket_id'] for row in rows]}), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Get all support tickets
 @customer_support_blueprint.route('/tickets', methods=['GET'])
 @admin_required
+@conditional_get(tickets.name)
 def get_tickets():
     """
     Get all support tickets
     ---
     tags:
       - Customer Support
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        maximum: 1000
+        description: Page size; with limit or cursor the response is one page wrapped with next_cursor
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. ticket_id,status
     responses:
       200:
         description: List of all tickets
@@ -141,19 +180,17 @@ def get_tickets():
                 type: string
                 nullable: true
                 example: 2024-01-10T15:30:00
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM customer_support")
-        tickets = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        return jsonify(list_rows(tickets, request.args)), 200
 
-        return jsonify(tickets), 200
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -161,6 +198,7 @@ def get_tickets():
 # Get a specific support ticket by ID
 @customer_support_blueprint.route('/tickets/<ticket_id>', methods=['GET'])
 @admin_required
+@conditional_get(tickets.name)
 def get_ticket(ticket_id):
     """
     Get a specific support ticket by ID
@@ -173,6 +211,11 @@ def get_ticket(ticket_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174002
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. ticket_id,status
     responses:
       200:
         description: Ticket details
@@ -203,6 +246,8 @@ def get_ticket(ticket_id):
               example: 2024-01-10T15:30:00
       404:
         description: Ticket not found
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
@@ -213,18 +258,15 @@ def get_ticket(ticket_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for ticket_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM customer_support WHERE ticket_id = %s", (ticket_id,))
-        ticket = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
+        ticket = tickets.get(ticket_id, parse_fields(tickets, request.args.get('fields')))
         if not ticket:
             return jsonify({"error": "Ticket not found"}), 404
 
         return jsonify(ticket), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -284,28 +326,15 @@ def update_ticket_status(ticket_id):
         if data['status'] not in valid_statuses:
             return jsonify({"error": "Invalid status. Valid statuses are: {', '.join(valid_statuses)}"}), 400
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
         # Set resolved_date if status is 'RESOLVED'
         if data['status'] == 'RESOLVED':
             resolved_date = datetime.now()
         else:
             resolved_date = None
 
-        cursor.execute("""
-        UPDATE customer_support 
-        SET status = %s, resolved_date = %s 
-        WHERE ticket_id = %s
-        """, (data['status'], resolved_date, ticket_id))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if tickets.update(ticket_id, {'status': data['status'], 'resolved_date': resolved_date}) == 0:
             return jsonify({"error": "Ticket not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Ticket status updated successfully"}), 200
 
     except Exception as e:
@@ -347,22 +376,14 @@ def delete_ticket(ticket_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for ticket_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM customer_support WHERE ticket_id = %s", (ticket_id,))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if tickets.delete(ticket_id) == 0:
             return jsonify({"error": "Ticket not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Ticket deleted successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    
+
 @customer_support_blueprint.route('/top_resolvers', methods=['GET'])
 @admin_required
 def api_employees_top_resolvers():
@@ -1,12 +1,23 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
-import uuid, re
-from datetime import datetime
-from database import get_db_connection
+import uuid
+from crud import Column, Table, iso_datetime, list_rows, matches, new_id, parse_fields, uuid_string
+from versions import conditional_get
 from .admin import admin_required
 
 employee_blueprint = Blueprint('employee', __name__)
 
+employees = Table('employee', 'employee_id', 'employees', [
+    Column('employee_id', default=new_id, writable=False),
+    Column('branch_id', uuid_string('Invalid UUID string for branch_id'), required=True),
+    Column('first_name', required=True),
+    Column('last_name', required=True),
+    Column('position', required=True),
+    Column('hire_date', iso_datetime('Invalid hire_date format. Use ISO 8601.'), required=True),
+    Column('phone_number', required=True),
+    Column('email', matches(r"[^@]+@[^@]+\.[^@]+", "Invalid email format."), required=True),
+])
+
 # Create a new employee
 @employee_blueprint.route('/employees', methods=['POST'])
 @admin_required
@@ -65,71 +76,92 @@ def create_employee():
 
     data = request.get_json()
     try:
-        # Validate required fields
-        required_fields = ['branch_id', 'first_name', 'last_name', 'position', 'hire_date', 'phone_number', 'email']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
-        
-        try:
-            uuid.UUID(data['branch_id'])
-        except ValueError:
-            return jsonify({'error': 'Invalid UUID string for branch_id'})
-
-        # Validate email format
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", data['email']):
-            raise BadRequest("Invalid email format.")
-        
-        # Generate unique employee ID
-        employee_id = str(uuid.uuid4())
-
-        # Parse hire_date
-        hire_date = datetime.fromisoformat(data['hire_date'])
-
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare SQL query
-        query = """
-        INSERT INTO employee (employee_id, branch_id, first_name, last_name, position, hire_date, phone_number, email)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        params = (
-        employee_id,
-        data['branch_id'],
-        data['first_name'],
-        data['last_name'],
-        data['position'],
-        hire_date,
-        data['phone_number'],
-        data['email'],
-        )
-
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
-
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
-        return jsonify({"message": "Employee created successfully", "employee_id": employee_id}), 201
+        values = employees.parse(data)
+        employees.insert(values)
+        return jsonify({"message": "Employee created successfully", "employee_id": values['employee_id']}), 201
+
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Create employees in bulk
+@employee_blueprint.route('/employees/bulk', methods=['POST'])
+@admin_required
+def create_employees_bulk():
+    """
+    Create many employees at once
+    ---
+    tags:
+      - Employees
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Array of employees with the same fields as POST /employees, at most 1000
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      201:
+        description: Employees created successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: Employees created successfully
+            employee_ids:
+              type: array
+              items:
+                type: string
+      400:
+        description: Validation error, naming the first invalid row
+      500:
+        description: Internal server error
+    """
+
+    data = request.get_json()
+    try:
+        rows = employees.parse_many(data)
+        employees.insert_many(rows)
+        return jsonify({"message": "Employees created successfully", "employee_ids": [row['employee_id'] for row in rows]}), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Get all employees
 @employee_blueprint.route('/employees', methods=['GET'])
 @admin_required
+@conditional_get(employees.name)
 def get_employees():
     """
     Get all employees
     ---
     tags:
       - Employees
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        maximum: 1000
+        description: Page size; with limit or cursor the response is one page wrapped with next_cursor
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. employee_id,first_name,last_name
     responses:
       200:
         description: List of all employees
@@ -162,19 +194,17 @@ def get_employees():
               email:
                 type: string
                 example: talha@example.com
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM employee")
-        employees = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        return jsonify(list_rows(employees, request.args)), 200
 
-        return jsonify(employees), 200
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -182,6 +212,7 @@ def get_employees():
 # Get a specific employee by ID
 @employee_blueprint.route('/employees/<employee_id>', methods=['GET'])
 @admin_required
+@conditional_get(employees.name)
 def get_employee(employee_id):
     """
     Get a specific employee by ID
@@ -194,6 +225,11 @@ def get_employee(employee_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174004
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. employee_id,first_name,last_name
     responses:
       200:
         description: Employee details
@@ -226,6 +262,8 @@ def get_employee(employee_id):
               example: ece@example.com
       404:
         description: Employee not found
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
@@ -236,18 +274,15 @@ def get_employee(employee_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for employee_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM employee WHERE employee_id = %s", (employee_id,))
-        employee = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
+        employee = employees.get(employee_id, parse_fields(employees, request.args.get('fields')))
         if not employee:
             return jsonify({"error": "Employee not found"}), 404
 
         return jsonify(employee), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -318,57 +353,18 @@ def update_employee(employee_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for employee_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare update statements
-        updates = []
-        params = []
-        if 'branch_id' in data:
-            updates.append("branch_id = %s")
-            params.append(data['branch_id'])
-        if 'first_name' in data:
-            updates.append("first_name = %s")
-            params.append(data['first_name'])
-        if 'last_name' in data:
-            updates.append("last_name = %s")
-            params.append(data['last_name'])
-        if 'position' in data:
-            updates.append("position = %s")
-            params.append(data['position'])
-        if 'hire_date' in data:
-            updates.append("hire_date = %s")
-            params.append(datetime.fromisoformat(data['hire_date']))
-        if 'phone_number' in data:
-            updates.append("phone_number = %s")
-            params.append(data['phone_number'])
-        if 'email' in data:
-            updates.append("email = %s")
-            params.append(data['email'])
-
-        if not updates:
+        values = employees.parse(data, partial=True)
+        if not values:
             return jsonify({"error": "No valid fields to update"}), 400
 
-        # Add employee_id to the end of the params list
-        params.append(employee_id)
-
-        # Construct the SQL UPDATE query
-        query = f"UPDATE employee SET {', '.join(updates)} WHERE employee_id = %s"
-
-        # Execute the query and commit changes
-        cursor.execute(query, tuple(params))
-        connection.commit()
-
-        # Check if any rows were affected
-        if cursor.rowcount == 0:
+        if employees.update(employee_id, values) == 0:
             return jsonify({"error": "Employee not found"}), 404
 
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Employee updated successfully"}), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -408,17 +404,9 @@ def delete_employee(employee_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for employee_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM employee WHERE employee_id = %s", (employee_id,))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if employees.delete(employee_id) == 0:
             return jsonify({"error": "Employee not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Employee deleted successfully"}), 200
 
     except Exception as e:
@@ -1,12 +1,27 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.exceptions import BadRequest
 import uuid
-from datetime import date
-from database import get_db_connection
+from crud import Column, Table, iso_date, list_rows, new_id, one_of, parse_fields, uuid_string
+from versions import conditional_get
 from .admin import admin_required
 
 loan_blueprint = Blueprint('loan', __name__)
 
+def check_loan_dates(values):
+    if values['start_date'] >= values['end_date']:
+        raise BadRequest("Start date must be before end date.")
+
+loans = Table('loan', 'loan_id', 'loans', [
+    Column('loan_id', default=new_id, writable=False),
+    Column('customer_id', uuid_string('Invalid UUID string for customer_id'), required=True),
+    Column('loan_type', one_of(['HOME', 'AUTO', 'PERSONAL'], "Invalid loan type. Valid types are: HOME, AUTO, PERSONAL"), required=True),
+    Column('principal_amount', required=True),
+    Column('interest_rate', required=True),
+    Column('start_date', iso_date("Invalid start_date format. Use YYYY-MM-DD."), required=True),
+    Column('end_date', iso_date("Invalid end_date format. Use YYYY-MM-DD."), required=True),
+    Column('status', default='ACTIVE', writable=False),
+], check=check_loan_dates)
+
 # Create a new loan
 @loan_blueprint.route('/loans', methods=['POST'])
 @admin_required
@@ -66,75 +81,92 @@ def create_loan():
 
     data = request.get_json()
     try:
-        # Validate required fields
-        required_fields = ['customer_id', 'loan_type', 'principal_amount', 'interest_rate', 'start_date', 'end_date']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            raise BadRequest(f"Missing required fields: {', '.join(missing_fields)}")
+        values = loans.parse(data)
+        loans.insert(values)
+        return jsonify({"message": "Loan created successfully", "loan_id": values['loan_id']}), 201
 
-        # Validate customer_id
-        try:
-            uuid.UUID(data['customer_id'])
-        except ValueError:
-            return jsonify({'error': 'Invalid UUID string for customer_id'})
-
-        # Validate loan type
-        valid_loan_types = ['HOME', 'AUTO', 'PERSONAL']
-        if data['loan_type'] not in valid_loan_types:
-            raise BadRequest(f"Invalid loan type. Valid types are: {', '.join(valid_loan_types)}")
-
-        # Validate dates
-        start_date = date.fromisoformat(data['start_date'])
-        end_date = date.fromisoformat(data['end_date'])
-        if start_date >= end_date:
-            raise BadRequest("Start date must be before end date.")
-
-        # Generate unique loan ID
-        loan_id = str(uuid.uuid4())
-
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        # Prepare SQL query
-        query = """
-        INSERT INTO loan (loan_id, customer_id, loan_type, principal_amount, interest_rate, start_date, end_date, status)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, 'ACTIVE')
-        """
-        params = (
-        loan_id,
-        data['customer_id'],
-        data['loan_type'],
-        data['principal_amount'],
-        data['interest_rate'],
-        start_date,
-        end_date,
-        )
-
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
-
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
-
-        return jsonify({"message": "Loan created successfully", "loan_id": loan_id}), 201
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Create loans in bulk
+@loan_blueprint.route('/loans/bulk', methods=['POST'])
+@admin_required
+def create_loans_bulk():
+    """
+    Create many loans at once
+    ---
+    tags:
+      - Loans
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Array of loans with the same fields as POST /loans, at most 1000
+        schema:
+          type: array
+          items:
+            type: object
+    responses:
+      201:
+        description: Loans created successfully
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: Loans created successfully
+            loan_ids:
+              type: array
+              items:
+                type: string
+      400:
+        description: Validation error, naming the first invalid row
+      500:
+        description: Internal server error
+    """
+
+    data = request.get_json()
+    try:
+        rows = loans.parse_many(data)
+        loans.insert_many(rows)
+        return jsonify({"message": "Loans created successfully", "loan_ids": [row['loan_id'] for row in rows]}), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Get all loans
 @loan_blueprint.route('/loans', methods=['GET'])
 @admin_required
+@conditional_get(loans.name)
 def get_loans():
     """
     Get all loans
     ---
     tags:
       - Loans
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        maximum: 1000
+        description: Page size; with limit or cursor the response is one page wrapped with next_cursor
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. loan_id,loan_type,status
     responses:
       200:
         description: List of loans
@@ -171,19 +203,17 @@ def get_loans():
                 example: ACTIVE
       403:
         description: Access forbidden (Admin only)
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
 
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM loan")
-        loans = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        return jsonify(list_rows(loans, request.args)), 200
 
-        return jsonify(loans), 200
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -191,6 +221,7 @@ def get_loans():
 # Get a specific loan by ID
 @loan_blueprint.route('/loans/<loan_id>', methods=['GET'])
 @admin_required
+@conditional_get(loans.name)
 def get_loan(loan_id):
     """
     Get a specific loan by ID
@@ -203,6 +234,11 @@ def get_loan(loan_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174003
+      - name: fields
+        in: query
+        required: false
+        type: string
+        description: Comma-separated columns to return, e.g. loan_id,loan_type,status
     responses:
       200:
         description: Loan details
@@ -239,6 +275,8 @@ def get_loan(loan_id):
         description: Loan not found
       403:
         description: Access forbidden (Admin only)
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       500:
         description: Internal server error
     """
@@ -249,18 +287,15 @@ def get_loan(loan_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for loan_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM loan WHERE loan_id = %s", (loan_id,))
-        loan = cursor.fetchone()
-        cursor.close()
-        connection.close()
-
+        loan = loans.get(loan_id, parse_fields(loans, request.args.get('fields')))
         if not loan:
             return jsonify({"error": "Loan not found"}), 404
 
         return jsonify(loan), 200
 
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -322,18 +357,9 @@ def update_loan_status(loan_id):
         if data['status'] not in valid_statuses:
             return jsonify({"error": "Invalid status. Valid statuses are: {', '.join(valid_statuses)}"}), 400
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-
-        cursor.execute("UPDATE loan SET status = %s WHERE loan_id = %s", (data['status'], loan_id))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if loans.update(loan_id, {'status': data['status']}) == 0:
             return jsonify({"error": "Loan not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Loan status updated successfully"}), 200
 
     except Exception as e:
@@ -377,17 +403,9 @@ def delete_loan(loan_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for loan_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM loan WHERE loan_id = %s", (loan_id,))
-        connection.commit()
-
-        if cursor.rowcount == 0:
+        if loans.delete(loan_id) == 0:
             return jsonify({"error": "Loan not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Loan deleted successfully"}), 200
 
     except Exception as e:
@@ -1,13 +1,48 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.exceptions import BadRequest
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from werkzeug.exceptions import BadRequest, Forbidden, HTTPException, NotFound
 import uuid
+import io
+import csv
+import json
+import base64
+import pymysql.cursors
 from datetime import datetime
-from database import get_db_connection
+from decimal import Decimal
+from database import get_db_connection, run_in_transaction
+from crud import parse_limit
+from idempotency import get_idempotency_key, find_response, claim_key, store_response, remember_response, is_duplicate
 from .admin import admin_required
+from .user import get_user_customer
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 transaction_blueprint = Blueprint('transaction', __name__)
 
+def parse_timestamp(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an ISO 8601 timestamp")
+
+def encode_cursor(row, *extra):
+    """Opaque keyset cursor for the (transaction_timestamp, transaction_id) of a row, plus any extra state."""
+    key = json.dumps([row['transaction_timestamp'].isoformat(), row['transaction_id'], *extra])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+def decode_cursor(value):
+    """Return (transaction_timestamp, transaction_id, *extra) from a cursor made by encode_cursor."""
+    try:
+        timestamp, transaction_id, *extra = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        return (datetime.fromisoformat(timestamp), str(transaction_id), *extra)
+    except (ValueError, TypeError):
+        raise BadRequest("Invalid cursor")
+
+def paginate(rows, limit, key, *cursor_extra):
+    """Trim the look-ahead row fetched past limit and attach the cursor for the next page."""
+    next_cursor = encode_cursor(rows[limit - 1], *cursor_extra) if len(rows) > limit else None
+    return {key: rows[:limit], 'next_cursor': next_cursor}
+
 # Create a new transaction
 @transaction_blueprint.route('/transactions', methods=['POST'])
 @admin_required
@@ -18,6 +53,12 @@ def create_transaction():
     tags:
       - Transactions
     parameters:
+      - name: Idempotency-Key
+        in: header
+        required: false
+        type: string
+        description: Retrying with the same key returns the original response instead of repeating the write
+        example: 3f2b8c1e-payroll-2024-01-05-0001
       - name: body
         in: body
         required: true
@@ -56,8 +97,16 @@ def create_transaction():
       500:
         description: Internal server error
     """
+    user_id = get_jwt_identity()
     data = request.get_json()
     try:
+        # Replay the stored outcome of a retried request
+        idempotency_key = get_idempotency_key()
+        if idempotency_key:
+            replay = find_response(user_id, 'create_transaction', idempotency_key)
+            if replay:
+                return replay
+
         # Validate required fields
         required_fields = ['from_account_id', 'transaction_type', 'amount']
         missing_fields = [field for field in required_fields if field not in data]
@@ -76,10 +125,25 @@ def create_transaction():
         if data['transaction_type'] == 'TRANSFER':
             if 'to_account_id' not in data:
                 raise BadRequest("To account ID is required for transfers.")
+            to_account_id = data['to_account_id']
+        else:
+            to_account_id = None
 
-        # Connect to database and create cursor
-        connection = get_db_connection()
-        cursor = connection.cursor()
+        amount = data['amount']
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+            raise BadRequest("Amount must be a numeric value")
+        amount = Decimal(str(amount))
+        if not amount.is_finite() or amount <= 0:
+            raise BadRequest("Amount must be greater than 0")
+
+        # What the transaction does to each balance, so the account balances and the rows that
+        # running balances are walked back from stay in step
+        if data['transaction_type'] == 'DEPOSIT':
+            balance_changes = {data['from_account_id']: amount}
+        else:
+            balance_changes = {data['from_account_id']: -amount}
+            if to_account_id:
+                balance_changes[to_account_id] = balance_changes.get(to_account_id, 0) + amount
 
         # Generate unique transaction ID
         transaction_id = str(uuid.uuid4())
@@ -92,84 +156,344 @@ def create_transaction():
         params = (
         transaction_id,
         data['from_account_id'],
-        data.get('to_account_id', None),  # Set to_account_id to None for deposits and withdrawals
+        to_account_id,  # None for deposits and withdrawals
         data['transaction_type'],
-        data['amount'],
+        amount,
         transaction_timestamp,
         )
 
-        # Execute query and commit changes
-        cursor.execute(query, params)
-        connection.commit()
+        body = {"message": "Transaction created successfully", "transaction_id": transaction_id}
 
-        # Close connection and cursor
-        cursor.close()
-        connection.close()
+        def create(cursor):
+            if idempotency_key:
+                claim_key(cursor, user_id, 'create_transaction', idempotency_key)
+            apply_balance_changes(cursor, balance_changes)
+            cursor.execute(query, params)
+            update_customer_totals(cursor, [(data['from_account_id'], to_account_id, amount)])
+            if idempotency_key:
+                store_response(cursor, user_id, 'create_transaction', idempotency_key, body, 201)
+
+        # The transaction row, the per-customer totals and the idempotency key are committed together
+        try:
+            run_in_transaction(create)
+        except Exception as e:
+            # A concurrent request with the same key committed first
+            replay = idempotency_key and is_duplicate(e) and find_response(user_id, 'create_transaction', idempotency_key)
+            if replay:
+                return replay
+            raise
 
-        return jsonify({"message": "Transaction created successfully", "transaction_id": transaction_id}), 201
+        if idempotency_key:
+            remember_response(user_id, 'create_transaction', idempotency_key, body, 201)
+
+        return jsonify(body), 201
 
     except BadRequest as e:
         return jsonify({"error": str(e)}), 400
+    except NotFound as e:
+        return jsonify({"error": e.description}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def apply_balance_changes(cursor, changes):
+    """
+    Add {account_id: amount} to account balances, locking the rows in account_id order like
+    transfers do. Raises NotFound for a missing account and BadRequest if a balance would go
+    below zero.
+    """
+    for account_id in sorted(changes):
+        cursor.execute("SELECT balance FROM account WHERE account_id = %s FOR UPDATE", (account_id,))
+        account = cursor.fetchone()
+        if not account:
+            raise NotFound("Account not found")
+        if account['balance'] + changes[account_id] < 0:
+            raise BadRequest("Insufficient balance")
+        if changes[account_id]:
+            cursor.execute("UPDATE account SET balance = balance + %s WHERE account_id = %s", (changes[account_id], account_id))
+
 # Get all transactions
 @transaction_blueprint.route('/transactions', methods=['GET'])
 @admin_required
 def get_transactions():
     """
-    Get all transactions
+    Get transactions, newest first, one page at a time
     ---
     tags:
       - Transactions
+    parameters:
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        default: 100
+        maximum: 1000
+        example: 100
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
+      - name: since
+        in: query
+        required: false
+        type: string
+        format: date-time
+        description: Only transactions at or after this timestamp
+        example: 2024-01-01T00:00:00
+      - name: until
+        in: query
+        required: false
+        type: string
+        format: date-time
+        description: Only transactions before this timestamp
+        example: 2024-02-01T00:00:00
+      - name: type
+        in: query
+        required: false
+        type: string
+        enum: [TRANSFER, WITHDRAWAL, DEPOSIT]
+      - name: min_amount
+        in: query
+        required: false
+        type: number
+        example: 100
     responses:
       200:
-        description: List of transactions
+        description: A page of transactions
         schema:
-          type: array
-          items:
-            type: object
-            properties:
-              transaction_id:
-                type: string
-                example: 123e4567-e89b-12d3-a456-426614174004
-              sender_account_id:
-                type: string
-                example: 123e4567-e89b-12d3-a456-426614174002
-              receiver_account_id:
-                type: string
-                example: 123e4567-e89b-12d3-a456-426614174003
-              amount:
-                type: number
-                example: 250.75
-              transaction_type:
-                type: string
-                example: TRANSFER
-              transaction_date:
-                type: string
-                example: 2024-01-05T12:00:00
+          type: object
+          properties:
+            transactions:
+              type: array
+              items:
+                type: object
+                properties:
+                  transaction_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174004
+                  from_account_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174002
+                  to_account_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174003
+                  amount:
+                    type: number
+                    example: 250.75
+                  transaction_type:
+                    type: string
+                    example: TRANSFER
+                  transaction_timestamp:
+                    type: string
+                    example: 2024-01-05T12:00:00
+            next_cursor:
+              type: string
+              description: Pass as cursor to fetch the next page, null on the last page
+              example: WyIyMDI0LTAxLTA1VDEyOjAwOjAwIiwgIjEyM2U0NTY3Il0
+      400:
+        description: Invalid filter or cursor
       500:
         description: Internal server error
     """
     try:
+        limit = parse_limit(request.args.get('limit'))
+        conditions = []
+        params = []
+
+        since = parse_timestamp(request.args.get('since'), 'since')
+        if since:
+            conditions.append("transaction_timestamp >= %s")
+            params.append(since)
+
+        until = parse_timestamp(request.args.get('until'), 'until')
+        if until:
+            conditions.append("transaction_timestamp < %s")
+            params.append(until)
+
+        transaction_type = request.args.get('type')
+        if transaction_type:
+            valid_transaction_types = ['DEPOSIT', 'WITHDRAWAL', 'TRANSFER']
+            if transaction_type not in valid_transaction_types:
+                raise BadRequest(f"Invalid transaction type. Valid types are: {', '.join(valid_transaction_types)}")
+            conditions.append("transaction_type = %s")
+            params.append(transaction_type)
+
+        min_amount = request.args.get('min_amount')
+        if min_amount is not None:
+            try:
+                min_amount = Decimal(min_amount)
+            except ArithmeticError:
+                raise BadRequest("min_amount must be a number")
+            # Decimal also parses NaN and Infinity, which the database driver can't send
+            if not min_amount.is_finite():
+                raise BadRequest("min_amount must be a number")
+            conditions.append("amount >= %s")
+            params.append(min_amount)
+
+        cursor_value = request.args.get('cursor')
+        if cursor_value:
+            # Keyset condition: strictly after the last row of the previous page
+            last_timestamp, last_transaction_id, *_ = decode_cursor(cursor_value)
+            conditions.append("(transaction_timestamp < %s OR (transaction_timestamp = %s AND transaction_id < %s))")
+            params.extend([last_timestamp, last_timestamp, last_transaction_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT * FROM transaction
+        {where}
+        ORDER BY transaction_timestamp DESC, transaction_id DESC
+        LIMIT %s
+        """
+        # One extra row tells us whether there is a next page
+        params.append(limit + 1)
+
         connection = get_db_connection()
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM transaction")
+        cursor.execute(query, tuple(params))
         transactions = cursor.fetchall()
         cursor.close()
         connection.close()
 
-        return jsonify(transactions), 200
+        return jsonify(paginate(transactions, limit, 'transactions')), 200
 
+    except BadRequest as e:
+        return jsonify({"error": e.description}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Rows per chunk written to the client when streaming exports
+EXPORT_CHUNK_ROWS = 1000
+
+# Stream every transaction as NDJSON or CSV
+@transaction_blueprint.route('/transactions/export', methods=['GET'])
+@admin_required
+def export_transactions():
+    """
+    Export transactions as a stream
+    ---
+    tags:
+      - Transactions
+    description: >
+      Streams matching transactions as newline-delimited JSON or CSV using an
+      unbuffered server-side cursor, so memory use stays flat regardless of
+      table size.
+    produces:
+      - application/x-ndjson
+      - text/csv
+    parameters:
+      - name: format
+        in: query
+        required: false
+        type: string
+        enum: [ndjson, csv]
+        default: ndjson
+      - name: since
+        in: query
+        required: false
+        type: string
+        format: date-time
+        example: 2024-01-01T00:00:00
+      - name: until
+        in: query
+        required: false
+        type: string
+        format: date-time
+        example: 2024-02-01T00:00:00
+    responses:
+      200:
+        description: Transactions, one per line
+      400:
+        description: Invalid format or filter
+      500:
+        description: Internal server error
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            raise BadRequest("format must be one of: ndjson, csv")
+
+        conditions = []
+        params = []
+        since = parse_timestamp(request.args.get('since'), 'since')
+        if since:
+            conditions.append("transaction_timestamp >= %s")
+            params.append(since)
+        until = parse_timestamp(request.args.get('until'), 'until')
+        if until:
+            conditions.append("transaction_timestamp < %s")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = get_db_connection()
+        try:
+            # Unbuffered cursor: rows are read off the socket as the response is written
+            cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+            cursor.execute(f"SELECT * FROM transaction {where} ORDER BY transaction_timestamp, transaction_id", tuple(params))
+        except Exception:
+            connection.discard()
+            raise
+
+        encode = encode_ndjson if export_format == 'ndjson' else encode_csv(cursor)
+
+        finished = False
+
+        def generate():
+            nonlocal finished
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                yield encode(rows)
+            finished = True
+
+        def release():
+            if finished:
+                cursor.close()
+                connection.close()
+            else:
+                # Client went away mid-stream, or the body was never read (HEAD); draining
+                # the rest of the result set would read the whole table, so drop the connection
+                connection.discard()
+
+        mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        # Runs when the server closes the response, whether or not the generator ever started
+        response.call_on_close(release)
+        response.headers['Content-Disposition'] = f'attachment; filename=transactions.{export_format}'
+        return response
+
+    except BadRequest as e:
+        return jsonify({"error": e.description}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def encode_ndjson(rows):
+    dumps = current_app.json.dumps
+    return ''.join(dumps(row) + '\n' for row in rows)
+
+def encode_csv(cursor):
+    """Return a chunk encoder that writes the CSV header before the first chunk."""
+    columns = [column[0] for column in cursor.description]
+    header_written = False
+
+    def encode(rows):
+        nonlocal header_written
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows([row[column] for column in columns] for row in rows)
+        return buffer.getvalue()
+
+    return encode
+
 # Get transactions for a specific account
 @transaction_blueprint.route('/accounts/<account_id>/transactions', methods=['GET'])
 @admin_required
 def get_account_transactions(account_id):
     """
-    Get all transactions for a specific account
+    Get transactions for a specific account, newest first, one page at a time
     ---
     tags:
       - Transactions
@@ -179,32 +503,73 @@ def get_account_transactions(account_id):
         required: true
         type: string
         example: 123e4567-e89b-12d3-a456-426614174002
+      - name: direction
+        in: query
+        required: false
+        type: string
+        enum: [in, out, both]
+        default: both
+        description: Only incoming, only outgoing, or all transactions of the account
+      - name: running_balance
+        in: query
+        required: false
+        type: boolean
+        default: false
+        description: >
+          Add the account balance after each transaction, anchored at the
+          balance when the first page was read. Requires direction=both.
+      - name: limit
+        in: query
+        required: false
+        type: integer
+        default: 100
+        maximum: 1000
+      - name: cursor
+        in: query
+        required: false
+        type: string
+        description: Opaque next_cursor value from the previous page
     responses:
       200:
-        description: List of transactions for the account
+        description: A page of transactions for the account
         schema:
-          type: array
-          items:
-            type: object
-            properties:
-              transaction_id:
-                type: string
-                example: 123e4567-e89b-12d3-a456-426614174004
-              sender_account_id:
-                type: string
-                example: 123e4567-e89b-12d3-a456-426614174002
-              receiver_account_id:
-                type: string
-                example: 123e4567-e89b-12d3-a456-426614174003
-              amount:
-                type: number
-                example: 250.75
-              transaction_type:
-                type: string
-                example: TRANSFER
-              transaction_date:
-                type: string
-                example: 2024-01-05T12:00:00
+          type: object
+          properties:
+            transactions:
+              type: array
+              items:
+                type: object
+                properties:
+                  transaction_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174004
+                  from_account_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174002
+                  to_account_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174003
+                  amount:
+                    type: number
+                    example: 250.75
+                  transaction_type:
+                    type: string
+                    example: TRANSFER
+                  transaction_timestamp:
+                    type: string
+                    example: 2024-01-05T12:00:00
+                  direction:
+                    type: string
+                    enum: [in, out]
+                    example: out
+                  running_balance:
+                    type: number
+                    example: 749.25
+            next_cursor:
+              type: string
+              description: Pass as cursor to fetch the next page, null on the last page
+      400:
+        description: Invalid parameters
       404:
         description: Account not found
       500:
@@ -216,21 +581,106 @@ def get_account_transactions(account_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for account_id'})
 
+        limit = parse_limit(request.args.get('limit'))
+
+        direction = request.args.get('direction', 'both')
+        if direction not in ('in', 'out', 'both'):
+            raise BadRequest("direction must be one of: in, out, both")
+
+        running_balance = request.args.get('running_balance', 'false').lower() in ('1', 'true', 'yes')
+        if running_balance and direction != 'both':
+            raise BadRequest("running_balance requires direction=both")
+
+        keyset = ""
+        keyset_params = ()
+        balance_after = None
+        cursor_value = request.args.get('cursor')
+        if cursor_value:
+            last_timestamp, last_transaction_id, *extra = decode_cursor(cursor_value)
+            keyset = "AND (transaction_timestamp < %s OR (transaction_timestamp = %s AND transaction_id < %s))"
+            keyset_params = (last_timestamp, last_timestamp, last_transaction_id)
+            if running_balance:
+                try:
+                    balance_after = Decimal(extra[0])
+                except (IndexError, TypeError, ArithmeticError):
+                    raise BadRequest("Cursor was not issued for a running_balance listing")
+
+        # Each branch is a range scan on its own (account, timestamp) index and stops
+        # after one page, instead of an OR that MySQL tends to answer with a full scan
+        outgoing = f"""
+        (SELECT *, 'out' AS direction FROM transaction
+        WHERE from_account_id = %s {keyset}
+        ORDER BY transaction_timestamp DESC, transaction_id DESC LIMIT %s)
+        """
+        incoming = f"""
+        (SELECT *, 'in' AS direction FROM transaction
+        WHERE to_account_id = %s {'AND from_account_id <> %s' if direction == 'both' else ''} {keyset}
+        ORDER BY transaction_timestamp DESC, transaction_id DESC LIMIT %s)
+        """
+        outgoing_params = (account_id, *keyset_params, limit + 1)
+        # Self transfers already come through the outgoing branch when both sides are listed
+        incoming_params = (account_id, *((account_id,) if direction == 'both' else ()), *keyset_params, limit + 1)
+
+        if direction == 'out':
+            query, params = outgoing, outgoing_params
+        elif direction == 'in':
+            query, params = incoming, incoming_params
+        else:
+            query = f"""
+            {outgoing}
+            UNION ALL
+            {incoming}
+            ORDER BY transaction_timestamp DESC, transaction_id DESC
+            LIMIT %s
+            """
+            params = outgoing_params + incoming_params + (limit + 1,)
+
         connection = get_db_connection()
         cursor = connection.cursor()
-        cursor.execute("""
-        SELECT * FROM transaction 
-        WHERE from_account_id = %s OR to_account_id = %s
-        """, (account_id, account_id))
+
+        if running_balance and balance_after is None:
+            # First page: anchor at the current balance. Both reads share the transaction's snapshot.
+            cursor.execute("SELECT balance FROM account WHERE account_id = %s", (account_id,))
+            account = cursor.fetchone()
+            if not account:
+                cursor.close()
+                connection.close()
+                return jsonify({"error": "Account not found"}), 404
+            balance_after = account['balance']
+
+        cursor.execute(query, params)
         transactions = cursor.fetchall()
         cursor.close()
         connection.close()
 
-        return jsonify(transactions), 200
+        if not running_balance:
+            return jsonify(paginate(transactions, limit, 'transactions')), 200
+
+        # Walk back in time: each row shows the balance right after it was applied
+        for transaction in transactions:
+            transaction['running_balance'] = balance_after
+            balance_after -= balance_delta(transaction, account_id)
 
+        # The look-ahead row carries the balance the next page starts from
+        next_balance = str(transactions[limit]['running_balance']) if len(transactions) > limit else None
+        return jsonify(paginate(transactions, limit, 'transactions', next_balance)), 200
+
+    except BadRequest as e:
+        return jsonify({"error": e.description}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def balance_delta(transaction, account_id):
+    """Signed effect of a transaction on the balance of account_id."""
+    if transaction['from_account_id'] == transaction['to_account_id']:
+        return 0
+    if transaction['to_account_id'] == account_id:
+        return transaction['amount']
+    # Deposits and withdrawals are booked against from_account_id
+    if transaction['transaction_type'] == 'DEPOSIT':
+        return transaction['amount']
+    return -transaction['amount']
+
 # Get a specific transaction by ID
 @transaction_blueprint.route('/transactions/<transaction_id>', methods=['GET'])
 @admin_required
@@ -333,22 +783,57 @@ def delete_transaction(transaction_id):
         except ValueError:
             return jsonify({'error': 'Invalid UUID string for transaction_id'})
 
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("DELETE FROM transaction WHERE transaction_id = %s", (transaction_id,))
-        connection.commit()
+        def delete(cursor):
+            cursor.execute(
+                "SELECT from_account_id, to_account_id, amount FROM transaction WHERE transaction_id = %s FOR UPDATE",
+                (transaction_id,)
+            )
+            transaction = cursor.fetchone()
+            if not transaction:
+                return False
+            cursor.execute("DELETE FROM transaction WHERE transaction_id = %s", (transaction_id,))
+            update_customer_totals(cursor, [(transaction['from_account_id'], transaction['to_account_id'], -transaction['amount'])])
+            return True
 
-        if cursor.rowcount == 0:
+        if not run_in_transaction(delete):
             return jsonify({"error": "Transaction not found"}), 404
 
-        cursor.close()
-        connection.close()
-
         return jsonify({"message": "Transaction deleted successfully"}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+def update_customer_totals(cursor, transactions, customers=None):
+    """
+    Add (from_account_id, to_account_id, amount) transactions to customer_transaction_total,
+    crediting the owner of each account involved. Pass a negative amount to take one back.
+    customers maps account_id to customer_id when the caller already has it.
+    """
+    customers = dict(customers or {})
+    unknown = {account_id for transaction in transactions for account_id in transaction[:2]
+               if account_id and account_id not in customers}
+    if unknown:
+        placeholders = ', '.join(['%s'] * len(unknown))
+        cursor.execute(f"SELECT account_id, customer_id FROM account WHERE account_id IN ({placeholders})", tuple(unknown))
+        customers.update((row['account_id'], row['customer_id']) for row in cursor.fetchall())
+
+    totals = {}
+    for from_account_id, to_account_id, amount in transactions:
+        # A transfer from an account to itself counts once
+        for account_id in {from_account_id, to_account_id}:
+            if account_id in customers:
+                customer_id = customers[account_id]
+                totals[customer_id] = totals.get(customer_id, 0) + Decimal(str(amount))
+
+    # Sorted so concurrent writers lock aggregate rows in the same order
+    rows = [(customer_id, totals[customer_id]) for customer_id in sorted(totals)]
+    if rows:
+        cursor.executemany("""
+            INSERT INTO customer_transaction_total (customer_id, total_amount)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE total_amount = total_amount + VALUES(total_amount)
+        """, rows)
+
 def get_customers_with_high_transactions(min_transaction_total):
     """
     Get customers with high transaction totals
@@ -394,13 +879,13 @@ def get_customers_with_high_transactions(min_transaction_total):
         connection = get_db_connection()
         cursor = connection.cursor()
 
+        # Range scan over the maintained per-customer totals instead of aggregating all transactions
         query = """
-        SELECT C.customer_id, C.first_name, C.last_name, SUM(T.amount) AS total_transaction
-        FROM customer C
-        JOIN account A ON C.customer_id = A.customer_id
-        JOIN transaction T ON A.account_id = T.from_account_id OR A.account_id = T.to_account_id
-        GROUP BY C.customer_id, C.first_name, C.last_name
-        HAVING SUM(T.amount) > %s;
+        SELECT C.customer_id, C.first_name, C.last_name, T.total_amount AS total_transaction
+        FROM customer_transaction_total T
+        JOIN customer C ON C.customer_id = T.customer_id
+        WHERE T.total_amount > %s
+        ORDER BY T.total_amount DESC;
         """
         cursor.execute(query, (min_transaction_total,))
         results = cursor.fetchall()
@@ -468,6 +953,37 @@ def api_customers_high_transactions(min_transaction_total):
     except Exception as e:
         return jsonify({'error': 'An unexpected error occurred.', 'details': str(e)}), 500
 
+def parse_transfer(data):
+    """Validate a transfer request body and return (sender_account_id, receiver_account_id, Decimal amount)."""
+    if not isinstance(data, dict):
+        raise BadRequest('Transfer must be a JSON object')
+
+    sender_account_id = data.get('sender_account_id')
+    receiver_account_id = data.get('receiver_account_id')
+    amount = data.get('amount')
+
+    # Validate input fields
+    if not sender_account_id or not receiver_account_id or amount is None:
+        raise BadRequest('All fields are required')
+    # Checked before the IDs are hashed into sets or sorted with other transfers' IDs, and put in
+    # the lowercase form account_id is stored in, which the batch's lookups are keyed by
+    account_ids = []
+    for name, account_id in (('sender_account_id', sender_account_id), ('receiver_account_id', receiver_account_id)):
+        try:
+            account_ids.append(str(uuid.UUID(account_id)))
+        except (AttributeError, TypeError, ValueError):
+            raise BadRequest(f'Invalid UUID string for {name}')
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        raise BadRequest('Amount must be a numeric value')
+    amount = Decimal(str(amount))
+    # JSON NaN and Infinity parse to floats; NaN can't be compared and Infinity can't be moved
+    if not amount.is_finite():
+        raise BadRequest('Amount must be a numeric value')
+    if amount <= 0:
+        raise BadRequest('Amount must be greater than 0')
+
+    return account_ids[0], account_ids[1], amount
+
 @transaction_blueprint.route('/money_transfer', methods=['POST'])
 @jwt_required()
 def money_transfer():
@@ -477,6 +993,12 @@ def money_transfer():
     tags:
       - Transactions
     parameters:
+      - name: Idempotency-Key
+        in: header
+        required: false
+        type: string
+        description: Retrying with the same key returns the original response instead of repeating the write
+        example: 3f2b8c1e-payroll-2024-01-05-0001
       - name: body
         in: body
         required: true
@@ -525,70 +1047,282 @@ def money_transfer():
     user_id = get_jwt_identity()
 
     try:
-        # Connect to DB
-        connection = get_db_connection()
-        cursor = connection.cursor()
+        # Replay the stored outcome of a retried request
+        idempotency_key = get_idempotency_key()
+        if idempotency_key:
+            replay = find_response(user_id, 'money_transfer', idempotency_key)
+            if replay:
+                return replay
+
+        sender_account_id, receiver_account_id, amount = parse_transfer(request.get_json())
+
+        def transfer(cursor):
+            # Claim the key before reading anything, so a concurrent retry waits for
+            # this attempt and replays it instead of re-checking the drained balance
+            if idempotency_key:
+                claim_key(cursor, user_id, 'money_transfer', idempotency_key)
+
+            # Fetch user and validate, usually straight from the cache
+            customer_id = get_user_customer(cursor, user_id)
+            if not customer_id:
+                raise NotFound('No customer associated with this user ID')
 
-        # Fetch user and validate
-        cursor.execute("SELECT customer_id FROM user WHERE user_id = %s", (user_id,))
-        customer_id = cursor.fetchone()
-        if not customer_id:
-            return jsonify({'error': 'No customer associated with this user ID'}), 404
+            # Lock both account rows in account_id order so that concurrent transfers
+            # touching the same accounts queue up instead of deadlocking
+            accounts = {}
+            for account_id in sorted({sender_account_id, receiver_account_id}):
+                cursor.execute(
+                    "SELECT account_id, customer_id, balance FROM account WHERE account_id = %s FOR UPDATE",
+                    (account_id,)
+                )
+                accounts[account_id] = cursor.fetchone()
 
+            # Check sender account
+            sender_account = accounts[sender_account_id]
+            if not sender_account or sender_account['customer_id'] != customer_id['customer_id']:
+                raise Forbidden('Invalid sender account or insufficient permissions')
+
+            # Check receiver account
+            if not accounts[receiver_account_id]:
+                raise NotFound('Receiver account not found')
+
+            # Balance check, safe because the sender row stays locked until commit
+            if sender_account['balance'] < amount:
+                raise BadRequest('Insufficient balance')
+
+            # Process transfer
+            cursor.execute("UPDATE account SET balance = balance - %s WHERE account_id = %s", (amount, sender_account_id))
+            cursor.execute("UPDATE account SET balance = balance + %s WHERE account_id = %s", (amount, receiver_account_id))
+
+            # Record transaction
+            transaction_id = str(uuid.uuid4())
+            transaction_timestamp = datetime.now()
+            cursor.execute("""
+                INSERT INTO transaction (transaction_id, from_account_id, to_account_id, transaction_type, amount, transaction_timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (transaction_id, sender_account_id, receiver_account_id, 'TRANSFER', amount, transaction_timestamp))
+            update_customer_totals(
+                cursor,
+                [(sender_account_id, receiver_account_id, amount)],
+                {account_id: account['customer_id'] for account_id, account in accounts.items()}
+            )
+
+            body = {
+                'message': 'Money transfer is successful',
+                'transaction_id': transaction_id,
+                'sender_account_id': sender_account_id,
+                'receiver_account_id': receiver_account_id,
+                'amount': float(amount)
+            }
+            if idempotency_key:
+                store_response(cursor, user_id, 'money_transfer', idempotency_key, body, 201)
+            return body
+
+        # Deadlocks and lock wait timeouts are retried automatically
+        try:
+            body = run_in_transaction(transfer)
+        except Exception as e:
+            # A concurrent request with the same key committed first; its transfer stands, ours rolled back
+            replay = idempotency_key and is_duplicate(e) and find_response(user_id, 'money_transfer', idempotency_key)
+            if replay:
+                return replay
+            raise
+
+        if idempotency_key:
+            remember_response(user_id, 'money_transfer', idempotency_key, body, 201)
+
+        return jsonify(body), 201
+
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Upper bound on transfers per batch request, keeps lock hold times and statement sizes reasonable
+MAX_BATCH_TRANSFERS = 1000
+
+@transaction_blueprint.route('/money_transfer/batch', methods=['POST'])
+@jwt_required()
+def money_transfer_batch():
+    """
+    Transfer money between accounts in bulk
+    ---
+    tags:
+      - Transactions
+    description: >
+      Applies many transfers in a single database transaction. Items are
+      processed in order against running balances; an item that fails
+      validation is reported and skipped without affecting the others.
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            transfers:
+              type: array
+              maxItems: 1000
+              items:
+                type: object
+                properties:
+                  sender_account_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174002
+                  receiver_account_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174003
+                  amount:
+                    type: number
+                    example: 200.75
+    responses:
+      200:
+        description: Batch processed, see per-item results
+        schema:
+          type: object
+          properties:
+            succeeded:
+              type: integer
+              example: 2
+            failed:
+              type: integer
+              example: 1
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                    example: 0
+                  status:
+                    type: string
+                    enum: [success, failed]
+                    example: success
+                  transaction_id:
+                    type: string
+                    example: 123e4567-e89b-12d3-a456-426614174004
+                  error:
+                    type: string
+                    example: Insufficient balance
+                  code:
+                    type: integer
+                    example: 400
+      400:
+        description: Malformed batch
+      404:
+        description: No customer associated with this user ID
+      500:
+        description: Internal server error
+    """
+    user_id = get_jwt_identity()
+
+    try:
         data = request.get_json()
-        sender_account_id = data.get('sender_account_id')
-        receiver_account_id = data.get('receiver_account_id')
-        amount = data.get('amount')
-
-        # Validate input fields
-        if not sender_account_id or not receiver_account_id or amount is None:
-            return jsonify({'error': 'All fields are required'}), 400
-        if amount <= 0:
-            return jsonify({'error': 'Amount must be greater than 0'}), 400
-
-        # Check sender account
-        cursor.execute("SELECT customer_id, balance FROM account WHERE account_id = %s", (sender_account_id,))
-        sender_account = cursor.fetchone()
-        if not sender_account or sender_account['customer_id'] != customer_id['customer_id']:
-            return jsonify({'error': 'Invalid sender account or insufficient permissions'}), 403
-
-        # Check receiver account
-        cursor.execute("SELECT * FROM account WHERE account_id = %s", (receiver_account_id,))
-        receiver_account = cursor.fetchone()
-        if not receiver_account:
-            return jsonify({'error': 'Receiver account not found'}), 404
-
-        # Balance check
-        if float(sender_account['balance']) < float(amount):
-            return jsonify({'error': 'Insufficient balance'}), 400
-
-        # Process transfer
-        cursor.execute("UPDATE account SET balance = balance - %s WHERE account_id = %s", (amount, sender_account_id))
-        cursor.execute("UPDATE account SET balance = balance + %s WHERE account_id = %s", (amount, receiver_account_id))
-
-        # Record transaction
-        transaction_id = str(uuid.uuid4())
-        transaction_timestamp = datetime.now()
-        cursor.execute("""
-            INSERT INTO transaction (transaction_id, from_account_id, to_account_id, transaction_type, amount, transaction_timestamp)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (transaction_id, sender_account_id, receiver_account_id, 'TRANSFER', amount, transaction_timestamp))
+        transfers = data.get('transfers') if isinstance(data, dict) else None
+        if not isinstance(transfers, list) or not transfers:
+            return jsonify({'error': 'transfers must be a non-empty array'}), 400
+        if len(transfers) > MAX_BATCH_TRANSFERS:
+            return jsonify({'error': f'At most {MAX_BATCH_TRANSFERS} transfers are allowed per batch'}), 400
+
+        # Validate the shape of every item up front; only well-formed items reach the database
+        parsed = []
+        for item in transfers:
+            try:
+                parsed.append(parse_transfer(item))
+            except BadRequest as e:
+                parsed.append(e)
 
-        connection.commit()
+        def transfer_batch(cursor):
+            # Fetch user and validate, usually straight from the cache
+            customer_id = get_user_customer(cursor, user_id)
+            if not customer_id:
+                raise NotFound('No customer associated with this user ID')
+
+            # Validate and lock every account in one query; the primary key range scan
+            # takes the row locks in account_id order, same as single transfers
+            account_ids = sorted({account_id for item in parsed if not isinstance(item, HTTPException) for account_id in item[:2]})
+            accounts = {}
+            if account_ids:
+                placeholders = ', '.join(['%s'] * len(account_ids))
+                cursor.execute(
+                    f"SELECT account_id, customer_id, balance FROM account WHERE account_id IN ({placeholders}) "
+                    "ORDER BY account_id FOR UPDATE",
+                    tuple(account_ids)
+                )
+                accounts = {row['account_id']: row for row in cursor.fetchall()}
+
+            # Apply items in order against running balances
+            balances = {account_id: row['balance'] for account_id, row in accounts.items()}
+            deltas = {}
+            rows = []
+            results = []
+            transaction_timestamp = datetime.now()
+            for index, item in enumerate(parsed):
+                if isinstance(item, HTTPException):
+                    results.append({'index': index, 'status': 'failed', 'error': item.description, 'code': item.code})
+                    continue
+
+                sender_account_id, receiver_account_id, amount = item
+                sender_account = accounts.get(sender_account_id)
+                if not sender_account or sender_account['customer_id'] != customer_id['customer_id']:
+                    error = Forbidden('Invalid sender account or insufficient permissions')
+                elif receiver_account_id not in accounts:
+                    error = NotFound('Receiver account not found')
+                elif balances[sender_account_id] < amount:
+                    error = BadRequest('Insufficient balance')
+                else:
+                    error = None
+
+                if error:
+                    results.append({'index': index, 'status': 'failed', 'error': error.description, 'code': error.code})
+                    continue
+
+                balances[sender_account_id] -= amount
+                balances[receiver_account_id] += amount
+                deltas[sender_account_id] = deltas.get(sender_account_id, 0) - amount
+                deltas[receiver_account_id] = deltas.get(receiver_account_id, 0) + amount
+
+                transaction_id = str(uuid.uuid4())
+                rows.append((transaction_id, sender_account_id, receiver_account_id, 'TRANSFER', amount, transaction_timestamp))
+                results.append({'index': index, 'status': 'success', 'transaction_id': transaction_id})
+
+            # One UPDATE for all net balance changes
+            deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+            if deltas:
+                cases = ' '.join(['WHEN %s THEN %s'] * len(deltas))
+                placeholders = ', '.join(['%s'] * len(deltas))
+                params = [value for pair in deltas.items() for value in pair] + list(deltas)
+                cursor.execute(
+                    f"UPDATE account SET balance = balance + CASE account_id {cases} END WHERE account_id IN ({placeholders})",
+                    tuple(params)
+                )
+
+            # Record all transactions in a single multi-row INSERT
+            if rows:
+                cursor.executemany("""
+                    INSERT INTO transaction (transaction_id, from_account_id, to_account_id, transaction_type, amount, transaction_timestamp)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, rows)
+                update_customer_totals(
+                    cursor,
+                    [row[1:3] + (row[4],) for row in rows],
+                    {account_id: account['customer_id'] for account_id, account in accounts.items()}
+                )
+
+            return results
+
+        # Deadlocks and lock wait timeouts are retried automatically
+        results = run_in_transaction(transfer_batch)
+        succeeded = sum(1 for result in results if result['status'] == 'success')
 
         return jsonify({
-            'message': 'Money transfer is successful',
-            'transaction_id': transaction_id,
-            'sender_account_id': sender_account_id,
-            'receiver_account_id': receiver_account_id,
-            'amount': float(amount)
-        }), 201
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
+        }), 200
 
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'connection' in locals():
-            connection.close()
\ No newline at end of file
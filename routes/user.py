@@ -1,11 +1,161 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash
+import os
+import threading
+import time
+import unicodedata
 import uuid
+from datetime import datetime, timedelta
 from database import get_db_connection
+from cache import BloomFilter, LRUCache
+from passwords import hash_password
 from .admin import admin_required
 
 user_blueprint = Blueprint('user', __name__)
 
+# user_id -> {'customer_id': ...} for authenticated hot paths. Entries are dropped when a user
+# is changed through this worker; the TTL bounds staleness for changes made through others.
+user_customer_cache = LRUCache(maxsize=10000, ttl=60)
+
+def get_user_customer(cursor, user_id):
+    """Return {'customer_id': ...} for a user, or None if the user does not exist."""
+    user = user_customer_cache.get(user_id)
+    if user is None:
+        cursor.execute("SELECT customer_id FROM user WHERE user_id = %s", (user_id,))
+        user = cursor.fetchone()
+        if user:
+            user_customer_cache.set(user_id, user)
+    return user
+
+# Bloom filter of existing usernames, so logins for names that don't exist skip the database:
+# a miss is final. Every worker records the names it creates in username_log, and a background
+# thread in each worker adds the new entries to its filter every USERNAME_CATCH_UP_INTERVAL
+# seconds, which bounds how long a user created through another worker can be turned away.
+# Every USERNAME_FILTER_TTL seconds the thread rebuilds the filter from the user table instead,
+# for users inserted outside the API, and trims log entries that every rebuild has seen.
+USERNAME_FILTER_TTL = 900
+USERNAME_CATCH_UP_INTERVAL = 2
+# AUTO_INCREMENT values are handed out at insert but become visible at commit, so a lower seq
+# can show up after a higher one; each catch-up re-reads this many entries below the last seen
+USERNAME_LOG_WINDOW = 1000
+USERNAME_LOG_PRUNE_BATCH = 1000
+username_filter = None
+username_filter_pid = None
+username_filter_lock = threading.Lock()
+
+class UsernameFilter:
+    """Bloom filter of normalized usernames, complete up to username_log entry `seq`."""
+
+    def __init__(self, bloom, seq):
+        self.bloom = bloom
+        self.seq = seq
+        self.built_at = time.monotonic()
+
+    def __contains__(self, name):
+        return name in self.bloom
+
+    def add(self, name):
+        self.bloom.add(name)
+
+    def catch_up(self):
+        """Add the names logged since the last catch-up, plus the USERNAME_LOG_WINDOW entries before it."""
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT seq, username FROM username_log WHERE seq > %s ORDER BY seq",
+                               (max(self.seq - USERNAME_LOG_WINDOW, 0),))
+                rows = cursor.fetchall()
+        finally:
+            connection.close()
+        for row in rows:
+            self.bloom.add(normalize_username(row['username']))
+        if rows:
+            self.seq = max(self.seq, rows[-1]['seq'])
+
+def normalize_username(username):
+    # Match MySQL's case and accent insensitive comparison of usernames
+    decomposed = unicodedata.normalize('NFKD', username)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+def build_username_filter():
+    global username_filter
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    # Read the log position first: names created during the scan are then caught up on later
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM username_log")
+    seq = cursor.fetchone()['seq']
+    cursor.execute("SELECT username FROM user")
+    usernames = [row['username'] for row in cursor.fetchall()]
+    cursor.close()
+    connection.close()
+
+    # Leave headroom for users created before the next rebuild
+    bloom = BloomFilter(capacity=2 * len(usernames) + 1000)
+    for username in usernames:
+        bloom.add(normalize_username(username))
+    username_filter = UsernameFilter(bloom, seq)
+
+def prune_username_log():
+    """Delete up to USERNAME_LOG_PRUNE_BATCH log entries old enough for every worker's rebuild to include."""
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM username_log WHERE created_at < %s LIMIT %s",
+                (datetime.now() - timedelta(seconds=2 * USERNAME_FILTER_TTL), USERNAME_LOG_PRUNE_BATCH)
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+def refresh_username_filter():
+    """Background loop keeping this worker's filter current; it never runs on a request."""
+    while True:
+        time.sleep(USERNAME_CATCH_UP_INTERVAL)
+        try:
+            names = username_filter
+            if names is None or time.monotonic() - names.built_at > USERNAME_FILTER_TTL:
+                build_username_filter()
+                prune_username_log()
+            else:
+                names.catch_up()
+        except Exception:
+            # Database unreachable; keep answering from the current filter and try again
+            pass
+
+def start_username_filter():
+    global username_filter_pid
+    with username_filter_lock:
+        # Threads don't survive a fork, so a worker forked from a preloaded app starts its own
+        if username_filter_pid != os.getpid():
+            username_filter_pid = os.getpid()
+            threading.Thread(target=refresh_username_filter, daemon=True).start()
+        # Logins that queued here while another one built the filter use that build
+        if username_filter is None:
+            try:
+                build_username_filter()
+            except Exception:
+                pass
+    return username_filter
+
+def username_may_exist(username):
+    """False if no user with this name existed at the last catch-up; never queries the database once built."""
+    names = username_filter
+    if names is None or username_filter_pid != os.getpid():
+        names = start_username_filter()
+    # Without a filter (database unreachable) fall through to the normal lookup
+    if names is None:
+        return True
+    return normalize_username(username) in names
+
+def log_username(cursor, username):
+    """Record a created or renamed username, in the same transaction, for every worker's login filter."""
+    cursor.execute("INSERT INTO username_log (username, created_at) VALUES (%s, %s)", (username, datetime.now()))
+
+def remember_username(username):
+    names = username_filter
+    if names is not None:
+        names.add(normalize_username(username))
+
 # create a new user
 @user_blueprint.route('/users', methods=['POST'])
 def create_user():
@@ -65,7 +215,7 @@ def create_user():
         if role not in ['ADMIN', 'USER']:
             return jsonify({"error": "Invalid role specified"}), 400
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         user_id = str(uuid.uuid4())
         
         connection = get_db_connection()
@@ -75,9 +225,11 @@ def create_user():
             VALUES (%s, %s, %s, %s, %s)""",
             (user_id, username, hashed_password, role, customer_id)
         )
+        log_username(cursor, username)
         connection.commit()
         cursor.close()
         connection.close()
+        remember_username(username)
 
         return jsonify({"message": "User created successfully", "user_id": user_id}), 201
     except Exception as e:
@@ -270,7 +422,7 @@ def update_user(user_id):
 
         if 'password' in data:
             updates.append("password = %s")
-            params.append(generate_password_hash(data['password']))
+            params.append(hash_password(data['password']))
 
         if 'role' in data and data['role'] in ['ADMIN', 'USER']:
             updates.append("role = %s")
@@ -286,7 +438,12 @@ def update_user(user_id):
         params.append(user_id)
         query = f"UPDATE user SET {', '.join(updates)} WHERE user_id = %s"
         cursor.execute(query, tuple(params))
+        if 'username' in data and cursor.rowcount:
+            log_username(cursor, data['username'])
         connection.commit()
+        user_customer_cache.pop(user_id)
+        if 'username' in data:
+            remember_username(data['username'])
 
         if cursor.rowcount == 0:
             return jsonify({"error": "User not found"}), 404
@@ -336,6 +493,7 @@ def delete_user(user_id):
         cursor = connection.cursor()
         cursor.execute("DELETE FROM user WHERE user_id = %s", (user_id,))
         connection.commit()
+        user_customer_cache.pop(user_id)
 
         if cursor.rowcount == 0:
             return jsonify({"error": "User not found"}), 404
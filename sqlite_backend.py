@@ -0,0 +1,292 @@
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+import pymysql.err
+
+# MySQL error codes raised for the SQLite failures the routes care about, so
+# code written against pymysql (duplicate keys, retryable lock timeouts,
+# missing tables) keeps working unchanged
+SQLITE_ERRORS = (
+    # (sqlite message prefix, pymysql exception, MySQL error code)
+    ('UNIQUE constraint failed', pymysql.err.IntegrityError, 1062),       # ER_DUP_ENTRY
+    ('FOREIGN KEY constraint failed', pymysql.err.IntegrityError, 1452),  # ER_NO_REFERENCED_ROW_2, 1451 on DELETE
+    ('NOT NULL constraint failed', pymysql.err.IntegrityError, 1048),     # ER_BAD_NULL_ERROR
+    ('CHECK constraint failed', pymysql.err.IntegrityError, 3819),        # ER_CHECK_CONSTRAINT_VIOLATED
+    ('database is locked', pymysql.err.OperationalError, 1205),          # ER_LOCK_WAIT_TIMEOUT
+    ('no such table', pymysql.err.ProgrammingError, 1146),               # ER_NO_SUCH_TABLE
+)
+
+# MySQL's DECIMAL keeps its scale; SQLite stores the value as a number, so the
+# declared type is rewritten to carry the scale for the converter that reads it
+DECIMAL_TYPE = 'DECIMAL_{scale}'
+MAX_DECIMAL_SCALE = 30
+
+# Table names that are keywords in SQLite but not reserved in MySQL, quoted wherever they appear
+QUOTED_IDENTIFIERS = ('transaction',)
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+_PLACEHOLDER = re.compile(r'%(s|%)')
+_FORCE_INDEX = re.compile(r'\bFORCE INDEX\s*\((\w+)\)', re.IGNORECASE)
+_FOR_UPDATE = re.compile(r'\s+FOR UPDATE\b', re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r'\bON DUPLICATE KEY UPDATE\b', re.IGNORECASE)
+_VALUES_FUNCTION = re.compile(r'\bVALUES\((\w+)\)', re.IGNORECASE)
+_DELETE_LIMIT = re.compile(r'^\s*DELETE FROM (\w+) WHERE (.+?) LIMIT (\S+)\s*$', re.IGNORECASE | re.DOTALL)
+_CREATE_TABLE = re.compile(r'^\s*CREATE TABLE (?:IF NOT EXISTS )?(\w+)', re.IGNORECASE)
+_ENUM_COLUMN = re.compile(r'\b(\w+) ENUM\(([^)]*)\)', re.IGNORECASE)
+_DECIMAL_COLUMN = re.compile(r'\bDECIMAL\((\d+),\s*(\d+)\)', re.IGNORECASE)
+_AUTO_INCREMENT = re.compile(r'\b\w*INT AUTO_INCREMENT PRIMARY KEY\b', re.IGNORECASE)
+_INLINE_INDEX = re.compile(r',\s*INDEX (\w+) (\([^)]*\))', re.IGNORECASE)
+_PARENTHESIZED_SELECT = re.compile(r'(^\s*|\bUNION(?:\s+ALL)?\s*)\(\s*SELECT\b', re.IGNORECASE)
+_QUOTED_IDENTIFIER = re.compile(rf"(?<![`\"'\w.])({'|'.join(QUOTED_IDENTIFIERS)})(?![`\"'\w])")
+
+
+def _convert_decimal(scale):
+    exponent = Decimal(1).scaleb(-scale)
+    return lambda value: Decimal(value.decode()).quantize(exponent)
+
+
+def _register_types():
+    # Parameters: Decimal as text so SQLite applies numeric affinity without
+    # going through a float, dates and datetimes the way MySQL prints them
+    sqlite3.register_adapter(Decimal, str)
+    sqlite3.register_adapter(date, date.isoformat)
+    sqlite3.register_adapter(datetime, lambda value: value.isoformat(' ', 'seconds'))
+    # Columns: back to the types pymysql returns for the same declarations
+    sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value[:10].decode()))
+    sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+    for scale in range(MAX_DECIMAL_SCALE + 1):
+        sqlite3.register_converter(DECIMAL_TYPE.format(scale=scale), _convert_decimal(scale))
+
+
+@lru_cache(maxsize=1024)
+def translate(sql, with_args=True):
+    """
+    Rewrite a MySQL statement for SQLite.
+
+    Returns (statements, write): the statement, followed by any extra DDL it
+    needed to be split into, and whether it writes, so the caller can take
+    the write lock up front the way MySQL's row locks would be taken.
+    """
+    write = sql.lstrip().split(None, 1)[0].upper() in WRITE_STATEMENTS
+    if _FOR_UPDATE.search(sql):
+        # SQLite locks the whole database rather than rows; taking the write
+        # lock when the transaction starts gives the same read-then-write safety
+        sql = _FOR_UPDATE.sub('', sql)
+        write = True
+    if with_args:
+        # pymysql only interpolates (and unescapes %%) when it is given arguments
+        sql = _PLACEHOLDER.sub(lambda m: '?' if m.group(1) == 's' else '%', sql)
+    sql = _FORCE_INDEX.sub(r'INDEXED BY \1', sql)
+    sql = _QUOTED_IDENTIFIER.sub(r'"\1"', sql)
+    # SQLite takes no parentheses around the SELECTs of a UNION; a subquery keeps their own ORDER BY and LIMIT
+    sql = _PARENTHESIZED_SELECT.sub(r'\1SELECT * FROM (SELECT', sql)
+
+    duplicate = _ON_DUPLICATE.search(sql)
+    if duplicate:
+        assignments = _VALUES_FUNCTION.sub(r'excluded.\1', sql[duplicate.end():])
+        sql = f"{sql[:duplicate.start()]}ON CONFLICT DO UPDATE SET{assignments}"
+
+    delete = _DELETE_LIMIT.match(sql)
+    if delete:
+        table, condition, limit = delete.groups()
+        sql = f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition} LIMIT {limit})"
+
+    extra = ()
+    table = _CREATE_TABLE.match(sql)
+    if table:
+        sql = _ENUM_COLUMN.sub(r'\1 TEXT CHECK (\1 IN (\2))', sql)
+        # Only an INTEGER PRIMARY KEY is the rowid, which AUTOINCREMENT keeps from reusing
+        sql = _AUTO_INCREMENT.sub('INTEGER PRIMARY KEY AUTOINCREMENT', sql)
+        sql = _DECIMAL_COLUMN.sub(lambda m: f"{DECIMAL_TYPE.format(scale=m.group(2))}({m.group(1)}, {m.group(2)})", sql)
+        extra = tuple(f"CREATE INDEX IF NOT EXISTS {name} ON {table.group(1)} {columns}"
+                      for name, columns in _INLINE_INDEX.findall(sql))
+        sql = _INLINE_INDEX.sub('', sql)
+    return (sql,) + extra, write
+
+
+def _mysql_error(error, sql=''):
+    message = str(error)
+    for prefix, error_class, code in SQLITE_ERRORS:
+        if message.startswith(prefix):
+            if code == 1452 and sql.lstrip().upper().startswith('DELETE'):
+                code = 1451  # ER_ROW_IS_REFERENCED_2: the row is still referenced, not missing a parent
+            return error_class(code, message)
+    if isinstance(error, sqlite3.IntegrityError):
+        return pymysql.err.IntegrityError(0, message)
+    if isinstance(error, sqlite3.ProgrammingError):
+        return pymysql.err.ProgrammingError(0, message)
+    return pymysql.err.OperationalError(0, message)
+
+
+class SQLiteCursor:
+    """
+    DictCursor look-alike over a sqlite3 cursor.
+
+    Takes %s placeholders and MySQL syntax (see translate), returns rows as
+    dicts keyed by column name, and raises pymysql exceptions carrying the
+    matching MySQL error codes.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection._raw.cursor()
+        self._names = None
+        self.arraysize = 1
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def _run(self, method, query, args):
+        statements, write = translate(query, args is not None)
+        try:
+            self.connection._begin(write)
+            method(statements[0], args if args is not None else ())
+            for statement in statements[1:]:
+                self._cursor.execute(statement)
+        except sqlite3.Error as e:
+            raise _mysql_error(e, statements[0]) from e
+        description = self._cursor.description
+        self._names = [column[0] for column in description] if description else None
+        return self._cursor.rowcount
+
+    def execute(self, query, args=None):
+        if args is not None and not isinstance(args, (tuple, list)):
+            args = (args,)
+        return self._run(self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        args = list(args)
+        if not args:
+            return 0
+        return self._run(self._cursor.executemany, query, args)
+
+    def _rows(self, rows):
+        names = self._names
+        return [dict(zip(names, row)) for row in rows]
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return None if row is None else dict(zip(self._names, row))
+
+    def fetchmany(self, size=None):
+        return self._rows(self._cursor.fetchmany(size or self.arraysize))
+
+    def fetchall(self):
+        return self._rows(self._cursor.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SQLiteConnection:
+    """
+    The slice of the pymysql connection API the app uses, over sqlite3.
+
+    Like a pymysql connection outside autocommit, every statement runs in a
+    transaction that lasts until commit() or rollback(). A transaction that
+    starts with a write (or a SELECT ... FOR UPDATE) takes SQLite's write
+    lock immediately; one that starts with a read only takes a snapshot.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    @property
+    def open(self):
+        return self._raw is not None
+
+    def cursor(self, cursor_class=None):
+        # SQLite rows are already produced lazily, so streaming cursors need no special class
+        return SQLiteCursor(self)
+
+    def _begin(self, write):
+        if not self._raw.in_transaction:
+            self._raw.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+
+    def commit(self):
+        try:
+            self._raw.commit()
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, reconnect=False):
+        if self._raw is None:
+            raise pymysql.err.InterfaceError(0, "Connection is closed")
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            raw.close()
+
+
+class SQLiteBackend:
+    """
+    SQLite stand-in for MySQL, for running and benchmarking the API without
+    a database server. Uses a WAL-mode database file, or with path
+    ':memory:' an in-memory database shared by every connection of this
+    process. It is meant for local load tests, not production: writes are
+    serialized on one database-wide lock and DECIMAL arithmetic happens in
+    floating point before being rounded back to the column's scale.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, timeout=10):
+        _register_types()
+        self.memory = path == ':memory:'
+        # The memdb VFS lets every connection in the process open the same in-memory database
+        self.path = 'file:/banking_api?vfs=memdb' if self.memory else path
+        self.timeout = timeout
+        self._keepalive = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        raw = sqlite3.connect(self.path, timeout=self.timeout, uri=self.memory, isolation_level=None,
+                              check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        raw.execute('PRAGMA foreign_keys = ON')
+        if not self.memory:
+            raw.execute('PRAGMA journal_mode = WAL')
+            raw.execute('PRAGMA synchronous = NORMAL')
+        else:
+            with self._lock:
+                # An in-memory database disappears with its last connection, and the pool may close them all
+                if self._keepalive is None:
+                    self._keepalive = sqlite3.connect(self.path, uri=True, check_same_thread=False)
+        return SQLiteConnection(raw)
+
+    def index_names(self, cursor):
+        cursor.execute("SELECT tbl_name AS table_name, name AS index_name FROM sqlite_master WHERE type = 'index'")
+        return {(row['table_name'], row['index_name']) for row in cursor.fetchall()}
+
+    def lock(self, cursor, name, timeout):
+        # Migrations are serialized by SQLite's own write lock, taken by their first statement
+        return True
+
+    def unlock(self, cursor, name):
+        pass
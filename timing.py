@@ -0,0 +1,28 @@
+import contextvars
+import time
+
+
+class RequestTimings:
+    """Where the time of one sampled request went. Durations are in seconds."""
+
+    __slots__ = ('started', 'db', 'queries', 'rows', 'pool', 'serialize')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0         # executing statements and fetching their rows
+        self.queries = 0      # statements executed, an executemany counting once
+        self.rows = 0         # rows fetched
+        self.pool = 0.0       # waiting for a connection from the pool
+        self.serialize = 0.0  # encoding JSON responses
+
+    def server_timing(self, total):
+        """Server-Timing header value, in milliseconds as the header wants."""
+        return (f'total;dur={total * 1000:.2f}, '
+                f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries, {self.rows} rows", '
+                f'pool;dur={self.pool * 1000:.2f}, '
+                f'serialize;dur={self.serialize * 1000:.2f}')
+
+
+# Timings of the request being handled, or None when it was not sampled, in
+# which case the instrumented code paths cost one lookup of this variable
+current_timings = contextvars.ContextVar('request_timings', default=None)
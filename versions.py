@@ -0,0 +1,187 @@
+import hashlib
+import os
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+# Name of the shared memory segment table versions are kept in, so a write
+# handled by one worker process invalidates the ETags served by all of them
+# on the host. Set TABLE_VERSION_SHARED_MEMORY to '' to keep the counters in
+# this process instead: that is only correct when a single process serves the
+# app, as another worker would keep answering 304 for rows it didn't see
+# change, so it is refused when WEB_CONCURRENCY asks for more workers.
+# Platforms without POSIX shared memory and flock (Windows, whose servers run
+# the app in one process) always keep them in the process.
+TABLE_VERSION_SHARED_MEMORY = os.environ.get('TABLE_VERSION_SHARED_MEMORY', 'banking_api_table_versions')
+
+
+def code_version():
+    """
+    Identifies the deployed code, so ETags change whenever a deploy may
+    render rows differently: APP_VERSION if set (e.g. the git commit),
+    else a digest of the application's Python sources.
+    """
+    version = os.environ.get('APP_VERSION')
+    if version:
+        return hashlib.blake2b(version.encode(), digest_size=6).hexdigest()
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.blake2b(digest_size=6)
+    for directory in (root, os.path.join(root, 'routes')):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    digest.update(name.encode())
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+CODE_VERSION = code_version()
+
+
+class TableVersions:
+    """
+    Per-table change counters kept in this process. The random epoch keeps
+    ETags handed out before a restart from matching the reset counters.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:12]
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, table):
+        return self._versions.get(table, 0)
+
+    def bump(self, table):
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+
+
+class SharedTableVersions:
+    """
+    Per-table change counters in a named shared memory segment, shared by
+    every worker process on the host that opens the same name.
+
+    Tables are hashed onto a fixed number of counter slots; two tables that
+    share a slot just invalidate each other's ETags. The first slot holds a
+    random epoch written when the segment is created, so counters restarting
+    from zero after a reboot can't match ETags handed out before it. Reads
+    and writes are serialized with flock on a lock file next to the segment.
+    """
+
+    SLOT = struct.Struct('<Q')
+
+    def __init__(self, name, slots=256):
+        import fcntl
+        from multiprocessing import resource_tracker, shared_memory
+
+        self.slots = slots
+        self._flock = fcntl.flock
+        self._lock_exclusive = fcntl.LOCK_EX
+        self._unlock = fcntl.LOCK_UN
+        self._lock_fd = os.open(os.path.join('/tmp', f'{name}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_lock = threading.Lock()
+
+        size = self.SLOT.size * (slots + 1)
+        with self._locked():
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                self.SLOT.pack_into(self._shm.buf, 0, int.from_bytes(os.urandom(6), 'little'))
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+            # Outlive the process that happened to create the segment; workers come and go
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+            self.epoch = format(self.SLOT.unpack_from(self._shm.buf, 0)[0], 'x')
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            self._flock(self._lock_fd, self._lock_exclusive)
+            try:
+                yield
+            finally:
+                self._flock(self._lock_fd, self._unlock)
+
+    def _offset(self, table):
+        digest = hashlib.blake2b(table.encode(), digest_size=8).digest()
+        return (1 + int.from_bytes(digest, 'little') % self.slots) * self.SLOT.size
+
+    def get(self, table):
+        offset = self._offset(table)
+        with self._locked():
+            return self.SLOT.unpack_from(self._shm.buf, offset)[0]
+
+    def bump(self, table):
+        offset = self._offset(table)
+        with self._locked():
+            version = self.SLOT.unpack_from(self._shm.buf, offset)[0]
+            self.SLOT.pack_into(self._shm.buf, offset, (version + 1) & 0xFFFFFFFFFFFFFFFF)
+
+
+def make_table_versions():
+    if TABLE_VERSION_SHARED_MEMORY and os.name == 'posix':
+        return SharedTableVersions(TABLE_VERSION_SHARED_MEMORY)
+    if int(os.environ.get('WEB_CONCURRENCY') or 1) > 1:
+        raise RuntimeError("Per-process table versions can't be used with several workers; "
+                           "set TABLE_VERSION_SHARED_MEMORY to a shared memory segment name")
+    return TableVersions()
+
+# Made on first use, so importing the app (CLI commands, scripts) leaves nothing in /dev/shm,
+# and again after a fork: a forked child shares its parent's lock file description, and flock
+# would then let both hold the lock at once
+_table_versions = None
+_table_versions_pid = None
+_table_versions_lock = threading.Lock()
+
+def get_table_versions():
+    global _table_versions, _table_versions_pid
+    if _table_versions is None or _table_versions_pid != os.getpid():
+        with _table_versions_lock:
+            if _table_versions is None or _table_versions_pid != os.getpid():
+                _table_versions = make_table_versions()
+                _table_versions_pid = os.getpid()
+    return _table_versions
+
+
+def bump(table):
+    """Record that a table changed. Call after the write has committed."""
+    get_table_versions().bump(table)
+
+
+def table_etag(*tables):
+    """ETag for the current request's representation of the given tables as they are now."""
+    versions = get_table_versions()
+    state = '-'.join(str(versions.get(table)) for table in tables)
+    url = hashlib.blake2b(request.full_path.encode(), digest_size=6).hexdigest()
+    return f"{CODE_VERSION}-{versions.epoch}-{state}-{url}"
+
+
+def conditional_get(*tables):
+    """
+    Serve a GET endpoint with an ETag derived from the versions of `tables`,
+    answering a matching If-None-Match with 304 before the view runs.
+
+    The ETag is taken before the view reads anything, so a write racing the
+    read can only make the tag older than the body, never newer; the next
+    request then simply fetches again. Apply it below the auth decorator.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            etag = table_etag(*tables)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        return wrapper
+
+    return decorator